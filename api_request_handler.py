@@ -8,43 +8,203 @@ from source_formatting.commentary_parentheses import CommentaryParenthesesTransf
 from source_formatting.commentary_prefixes import CommentaryPrefixStripper
 from source_formatting.dibur_hamatchil import bold_diburei_hamatchil
 from source_formatting.hebrew_small_to_emphasis import HebrewSmallToEmphasisTagTranslator
+from source_formatting.html_parser import HtmlTranslationPipeline
 from source_formatting.image_numbering import ImageNumberingFormatter
 from source_formatting.jastrow import JastrowReformatter
 from source_formatting.otzar_laazei_rashi import format_otzar_laazei_rashi
 from source_formatting.section_symbol import SectionSymbolRemover
 from source_formatting.sefaria_link_sanitizer import SefariaLinkSanitizer
 from source_formatting.shulchan_arukh_remove_header import ShulchanArukhHeaderRemover
+from util.background_event_loop import shared_event_loop
+from util.lru_memo import LruMemo
+from util.sqlite_cache import SqliteCache
 import asyncio
+import concurrent.futures
+import functools
+import glob
+import hashlib
 import httpx
+import json
+import logging
+import os
 import re
 import masechtot
+import sqlite3
+import sys
+import time
+
+def _formatter_version():
+    """Returns a digest of the code and data that determine the processed output of requests.
+
+    Caches of processed output should include this version so that they are invalidated whenever
+    the formatting of the output changes.
+    """
+    digest = hashlib.sha1()
+    paths = ["api_request_handler.py", "hadran.py", "hebrew.py", "masechtot.py"]
+    paths += glob.glob("source_formatting/*.py")
+    paths += glob.glob("precomputed_texts/*.json")
+    for path in sorted(paths):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:12]
+
+FORMATTER_VERSION = _formatter_version()
 
 _ALEPH = "א"
 _TAV = "ת"
 _STEINSALTZ_SUGYA_START = re.compile("^<big>[%s-%s]" % (_ALEPH, _TAV))
 
 class RealRequestMaker(object):
+    """Requests texts from Sefaria using a single, pooled HTTP/2 client per process.
+
+    httpx clients are bound to the event loop that they are first used on, so the client is only
+    ever used from the process-wide background loop. Callers on any other loop (i.e. a script's own
+    `asyncio.run()`) hop over to that loop for the duration of the request. This way every thread
+    shares the same connections to sefaria.org instead of paying for a new TLS handshake on each
+    request.
+    """
+
+    def __init__(self, base_url="https://sefaria.org", http2=True, event_loop=None):
+        self._base_url = base_url
+        self._http2 = http2
+        self._event_loop = event_loop
+        # Only ever accessed from the loop that it was created on, so no locking is necessary
+        self._client = None
+        self._client_loop = None
+
+    async def request_amud(self, ref, headers=None):
+        event_loop = self._event_loop or shared_event_loop()
+        return await event_loop.run_async(self._request_amud(ref, headers, event_loop))
+
+    async def _request_amud(self, ref, headers, event_loop):
+        if self._client_loop is not event_loop:
+            self._client = httpx.AsyncClient(http2=self._http2)
+            self._client_loop = event_loop
+        return await self._client.get(
+            # https://github.com/Sefaria/Sefaria-Project/wiki/API-Documentation
+            f"{self._base_url}/api/texts/{ref}",
+            headers = headers,
+            params = {
+                "commentary": "1",
+                # This shouldn't have a difference for the Gemara reqeusts, but it does expand
+                # the Rashi/Tosafot requests to have the entire amud's worth of commentary
+                "pad": "0",
+                # Even with wrapLinks=1, Jastrow (and perhaps more) is still wrapped. Instead,
+                # an active filtering is performed just in case.
+                "wrapLinks": "0",
+            })
+
+class CachedResponse(object):
+    def __init__(self, text, status_code=200):
+        self.text = text
+        self.status_code = status_code
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class CachingRequestMaker(object):
+    """Wraps a request maker with a persistent cache of Sefaria's raw responses.
+
+    The raw responses are cached separately from any processed output, so that when formatting
+    changes, every ref can be reprocessed without fetching it again. Cached responses that are
+    younger than `max_age_seconds` are used without making a request. Older responses are
+    revalidated with a conditional request if Sefaria sent an ETag or Last-Modified header, and
+    refetched otherwise. If `max_age_seconds` is None, cached responses are always used.
+
+    `cache` should be created with `sefaria_response_cache()`.
+    """
+
+    def __init__(self, request_maker, cache, max_age_seconds=24 * 60 * 60):
+        self._request_maker = request_maker
+        self._cache = cache
+        self._max_age_seconds = max_age_seconds
+        self._logger = logging.getLogger(__name__)
+
     async def request_amud(self, ref):
-        # It seems like the http client should be cached, but that causes errors with the event
-        # loop. The httpx documentation mentions that the main benefits here are connection pooling,
-        # which would be nice since we connect to the same host repeatedly. But because there's a
-        # response cache in server.py, it's not an urgent peformance issue.
-        async with httpx.AsyncClient() as client:
-            return await client.get(
-                # https://github.com/Sefaria/Sefaria-Project/wiki/API-Documentation
-                f"https://sefaria.org/api/texts/{ref}",
-                params = {
-                    "commentary": "1",
-                    # This shouldn't have a difference for the Gemara reqeusts, but it does expand
-                    # the Rashi/Tosafot requests to have the entire amud's worth of commentary
-                    "pad": "0",
-                    # Even with wrapLinks=1, Jastrow (and perhaps more) is still wrapped. Instead,
-                    # an active filtering is performed just in case.
-                    "wrapLinks": "0",
-                })
+        # This usually runs on the shared event loop, which SQLite's blocking I/O would stall
+        event_loop = asyncio.get_running_loop()
+        entry = await event_loop.run_in_executor(None, self._get_cached, ref)
+        if entry:
+            text, etag, last_modified, fetched_at = entry
+            if self._max_age_seconds is None or time.time() - fetched_at < self._max_age_seconds:
+                return CachedResponse(text)
+
+        headers = {}
+        if entry and etag:
+            headers["If-None-Match"] = etag
+        if entry and last_modified:
+            headers["If-Modified-Since"] = last_modified
+        try:
+            response = await self._request_maker.request_amud(ref, headers=headers)
+        except httpx.HTTPError:
+            if not entry:
+                raise
+            self._logger.exception(f"Error revalidating {ref}. Using the stale response.")
+            return CachedResponse(text)
+
+        if response.status_code == 304 and entry:
+            await event_loop.run_in_executor(
+                None, self._put_cached, ref, text, etag, last_modified, time.time())
+            return CachedResponse(text)
+        if response.status_code >= 500 and entry:
+            # The stale entry is kept as-is, so that the next request revalidates it again
+            self._logger.warning(
+                f"{response.status_code} revalidating {ref}. Using the stale response.")
+            return CachedResponse(text)
+        if response.status_code == 200:
+            await event_loop.run_in_executor(
+                None,
+                self._put_cached,
+                ref,
+                response.text,
+                response.headers.get("ETag"),
+                response.headers.get("Last-Modified"),
+                time.time())
+        return response
+
+    # Errors from the cache (i.e. a locked database or a full disk) are treated as cache misses, so
+    # that they don't fail the request.
+
+    def _get_cached(self, ref):
+        try:
+            return self._cache.get_row(ref)
+        except sqlite3.Error:
+            self._logger.exception(f"Error reading {ref} from the cache")
+            return None
+
+    def _put_cached(self, ref, *values):
+        try:
+            self._cache.put_row(ref, *values)
+        except sqlite3.Error:
+            self._logger.exception(f"Error writing {ref} to the cache")
+
+def sefaria_response_cache(path, max_bytes=None):
+    """Returns a cache for `CachingRequestMaker` that's stored at `path`."""
+    return SqliteCache(
+        path,
+        version="2",
+        max_bytes=max_bytes,
+        columns=("text", "etag", "last_modified", "fetched_at"))
+
+
+_STANDARD_ENGLISH_TRANSFORMATIONS = HtmlTranslationPipeline(
+    SefariaLinkSanitizer,
+    SectionSymbolRemover)
+
+_JASTROW_ENGLISH_TRANSFORMATIONS = HtmlTranslationPipeline(
+    SefariaLinkSanitizer,
+    SectionSymbolRemover,
+    JastrowReformatter)
+
+_COMMENT_HEBREW_TRANSFORMATIONS = HtmlTranslationPipeline(
+    HebrewSmallToEmphasisTagTranslator,
+    CommentaryPrefixStripper,
+    CommentaryParenthesesTransformer,
+    ImageNumberingFormatter)
 
 def standard_english_transformations(english):
-    return SectionSymbolRemover.process(SefariaLinkSanitizer.process(english))
+    return _STANDARD_ENGLISH_TRANSFORMATIONS.process(english)
 
 
 _HADRAN_PATTERN = re.compile("^(<br>)+<big><strong>הדרן עלך .*")
@@ -53,12 +213,151 @@ def is_hadran(text):
     return len(_HADRAN_PATTERN.findall(strip_hebrew_nonletters(text))) > 0
 
 
+# The only fields of Sefaria's responses that are read. The rest (i.e. version metadata and title
+# variants) is dropped as soon as the object that contains it is parsed.
+_SEFARIA_RESPONSE_FIELDS = frozenset((
+    "anchorRefExpanded",
+    "category",
+    "collectiveTitle",
+    "commentary",
+    "commentator",
+    "en",
+    "he",
+    "indexTitle",
+    "ref",
+    "sourceHeRef",
+    "sourceRef",
+    "text",
+    "title",
+    "type",
+))
+
+# Stands in for a comment that isn't from any of _COMMENTARIES, until the list that contains it is
+# parsed.
+_UNUSED_COMMENT = object()
+
+def _projected_sefaria_object(result):
+    if "sourceRef" in result:
+        title = result.get("collectiveTitle")
+        if type(title) == dict and "en" in title and not _matching_commentary_kind(result):
+            return _UNUSED_COMMENT
+    elif "commentary" in result:
+        commentary = result["commentary"]
+        if type(commentary) == list and _UNUSED_COMMENT in commentary:
+            result["commentary"] = [
+                comment for comment in commentary if comment is not _UNUSED_COMMENT]
+    else:
+        # Only comments and responses are projected. The other objects are small (i.e. titles),
+        # and filtering them costs more than it saves.
+        return result
+    return {key: value for key, value in result.items() if key in _SEFARIA_RESPONSE_FIELDS}
+
+def parse_sefaria_response(text):
+    """Parses the JSON of a Sefaria /api/texts response, keeping only what the handlers use.
+
+    Comments are dropped entirely if they aren't from any of _COMMENTARIES, which is most of the
+    commentary on many amudim.
+    """
+    # An object_hook, unlike an object_pairs_hook, lets the decoder build each dict natively
+    return json.loads(text, object_hook=_projected_sefaria_object)
+
+
+class SectionAnchors(object):
+    """Places the comments of one Sefaria response in the sections of the text they comment on.
+
+    Each distinct anchor ref is only parsed once per response.
+    """
+
+    def __init__(self, section_prefix, section_splitter):
+        self._section_prefix = section_prefix
+        self._section_splitter = section_splitter
+        self._sections_by_anchor = {}
+
+    def _section(self, anchor):
+        if anchor in self._sections_by_anchor:
+            return self._sections_by_anchor[anchor]
+        section = None
+        if anchor.startswith(self._section_prefix):
+            try:
+                section = int(anchor.split(self._section_splitter)[1]) - 1
+            except ValueError as e:
+                section = e
+        self._sections_by_anchor[anchor] = section
+        return section
+
+    def section_span(self, comment):
+        """Returns the (first, last) sections that `comment` is anchored to, or None.
+
+        `first` is the section of the first anchor of the text, which isn't necessarily the lowest.
+        """
+        if "anchorRefExpanded" not in comment:
+            return None
+        first = last = None
+        for anchor in comment["anchorRefExpanded"]:
+            section = self._section(anchor)
+            if section is None:
+                continue
+            if isinstance(section, ValueError):
+                # Only the first anchor of the text is needed to place the comment
+                if first is None:
+                    raise section
+                continue
+            if first is None:
+                first = last = section
+            else:
+                last = max(last, section)
+        return None if first is None else (first, last)
+
+    def section_index(self, comment):
+        """Returns the section that `comment` is placed in."""
+        # TODO: question: if this spans multiple sections, is placing it in the first always
+        # correct?
+        # TODO: if the comment spans multiple pages, this could place it at the first mentioned
+        # section in the first page, and then duplicate it at the first section in the following
+        # page
+        span = self.section_span(comment)
+        return span and span[0]
+
+
+class _UnusableResponse(Exception):
+    pass
+
+
+# Handlers that have been created in this process by _process_in_formatting_process(), by class
+_formatting_process_handlers = {}
+_formatting_process_messages = []
+
+def _record_formatting_process_message(*message):
+    _formatting_process_messages.append(message)
+
+def _process_in_formatting_process(handler_class, sefaria_results, args):
+    """Returns the processed result, and the messages that were printed while processing it.
+
+    The messages are printed by the submitting process, with its own `print_function`.
+    """
+    handler = _formatting_process_handlers.get(handler_class)
+    if handler is None:
+        handler = _formatting_process_handlers[handler_class] = handler_class(
+            request_maker=None, print_function=_record_formatting_process_message)
+    del _formatting_process_messages[:]
+    return handler._process_sefaria_results(sefaria_results, *args), _formatting_process_messages
+
+
 class AbstractApiRequestHandler(object):
-    def __init__(self, request_maker, print_function=print):
+    """Requests texts from Sefaria, and processes them for talmud.page.
+
+    If `formatting_pool` (a `util.process_pool.ProcessPool`) is set, the responses are processed in
+    its worker processes. Formatting a busy amud holds the GIL for a long time, which would
+    otherwise stall every other thread in this process, even those that serve cached responses.
+    """
+
+    def __init__(self, request_maker, print_function=print, formatting_pool=None):
         self._request_maker = request_maker
         self._print = print_function
+        self._formatting_pool = formatting_pool
 
     def _make_requests(self, *args):
+        """Returns awaitables for the Sefaria responses, starting with the main response."""
         raise NotImplementedError()
 
     def _make_id(self, *args):
@@ -82,25 +381,86 @@ class AbstractApiRequestHandler(object):
     def _post_process_all_sections(self, sections, *args):
         return sections
 
+    async def handle_request_async(self, *args):
+        if self._formatting_pool:
+            sefaria_results = await asyncio.gather(*self._make_requests(*args))
+            return self._formatting_pool_result(await asyncio.wrap_future(
+                self._submit_to_formatting_pool(sefaria_results, args)))
+
+        requests = [asyncio.ensure_future(request) for request in self._make_requests(*args)]
+        try:
+            result, sections = self._start_result(self._parse_response(await requests[0]), *args)
+            for secondary_request in asyncio.as_completed(requests[1:]):
+                self._add_second_level_comments_to_result(
+                    self._parse_response(await secondary_request), sections)
+        except _UnusableResponse:
+            self._raise_bad_results_exception(await asyncio.gather(*requests))
+        return self._finish_result(result, sections, *args)
+
     def handle_request(self, *args):
-        sefaria_results = asyncio.run(self._make_requests(*args))
+        # The requests run on the process-wide event loop, but the results are processed on the
+        # calling thread so that CPU-bound formatting doesn't stall other requests that are waiting
+        # on the loop. The main response is processed as soon as it arrives, while the others are
+        # still in flight, and each of the others is added as soon as it arrives.
+        event_loop = shared_event_loop()
+        requests = [event_loop.submit(request) for request in self._make_requests(*args)]
+        if self._formatting_pool:
+            sefaria_results = [request.result() for request in requests]
+            return self._formatting_pool_result(
+                self._submit_to_formatting_pool(sefaria_results, args).result())
 
-        bad_results = list(filter(lambda x: x.status_code != 200, sefaria_results))
-        def _raise_bad_results_exception():
-            raise ApiException(
-                "\n".join(map(lambda x: x.text, bad_results)),
-                500,
-                ApiException.SEFARIA_HTTP_ERROR)
-        if bad_results:
-            _raise_bad_results_exception()
+        try:
+            result, sections = self._start_result(
+                self._parse_response(requests[0].result()), *args)
+            for secondary_request in concurrent.futures.as_completed(requests[1:]):
+                self._add_second_level_comments_to_result(
+                    self._parse_response(secondary_request.result()), sections)
+        except _UnusableResponse:
+            self._raise_bad_results_exception([request.result() for request in requests])
+        return self._finish_result(result, sections, *args)
+
+    def _submit_to_formatting_pool(self, sefaria_results, args):
+        # Responses (i.e. from httpx) can't be pickled, so only the parts that are used are sent
+        return self._formatting_pool.submit(
+            _process_in_formatting_process,
+            type(self),
+            [CachedResponse(result.text, result.status_code) for result in sefaria_results],
+            args)
+
+    def _formatting_pool_result(self, output):
+        result, messages = output
+        for message in messages:
+            self._print(*message)
+        return result
+
+    def _process_sefaria_results(self, sefaria_results, *args):
+        try:
+            results_as_json = list(map(self._parse_response, sefaria_results))
+        except _UnusableResponse:
+            self._raise_bad_results_exception(sefaria_results)
+
+        result, sections = self._start_result(results_as_json[0], *args)
+        for secondary_json in results_as_json[1:]:
+            self._add_second_level_comments_to_result(secondary_json, sections)
+        return self._finish_result(result, sections, *args)
 
+    def _parse_response(self, sefaria_result):
+        if sefaria_result.status_code != 200:
+            raise _UnusableResponse()
         try:
-            results_as_json = list(map(lambda x: x.json(), sefaria_results))
+            return parse_sefaria_response(sefaria_result.text)
         except Exception:
-            _raise_bad_results_exception()
+            raise _UnusableResponse()
 
-        main_json = results_as_json[0]
+    def _raise_bad_results_exception(self, sefaria_results):
+        bad_results = list(filter(lambda x: x.status_code != 200, sefaria_results))
+        raise ApiException(
+            "\n".join(map(lambda x: x.text, bad_results)),
+            500,
+            ApiException.SEFARIA_HTTP_ERROR)
 
+    def _start_result(self, main_json, *args):
+        """Creates the result and its sections from the main response, with its comments."""
         result = {
             "id": self._make_id(*args),
             "title": main_json.get("title", main_json["indexTitle"])
@@ -131,13 +491,13 @@ class AbstractApiRequestHandler(object):
                 "commentary": Commentary.create(),
             })
 
-        section_prefix = f"{main_ref}{self._section_splitter()}"
+        section_anchors = SectionAnchors(
+            f"{main_ref}{self._section_splitter()}", self._section_splitter())
         for comment in main_json["commentary"]:
-            self._add_comment_to_result(comment, sections, section_prefix)
-
-        for secondary_json in results_as_json[1:]:
-            self._add_second_level_comments_to_result(secondary_json, sections)
+            self._add_comment_to_result(comment, sections, section_anchors)
+        return result, sections
 
+    def _finish_result(self, result, sections, *args):
         sections = list(map(self._post_process_section, sections))
 
         sections = self._post_process_all_sections(sections, *args)
@@ -151,7 +511,7 @@ class AbstractApiRequestHandler(object):
         result["sections"] = sections
         return result
 
-    def _add_comment_to_result(self, comment, sections, section_prefix):
+    def _add_comment_to_result(self, comment, sections, section_anchors):
         if len(comment["he"]) == 0 and \
            len(comment["text"]) == 0:
             return
@@ -160,7 +520,7 @@ class AbstractApiRequestHandler(object):
         if not matching_commentary_kind:
             return
 
-        section = self._find_matching_section_index(comment, section_prefix)
+        section = section_anchors.section_index(comment)
         if section is None or section >= len(sections):
             self._print("Unplaceable comment:", comment["sourceRef"], comment["anchorRefExpanded"])
             return
@@ -168,31 +528,20 @@ class AbstractApiRequestHandler(object):
         sections[section]["commentary"].add_comment(
             Comment.create(comment, matching_commentary_kind["englishName"]))
 
-    def _find_matching_section_index(self, comment, section_prefix):
-        if "anchorRefExpanded" not in comment:
-            return
-        # TODO: question: if this spans multiple sections, is placing it in the first always
-        # correct?
-        # TODO: if the comment spans multiple pages, this could place it at the first mentioned
-        # section in the first page, and then duplicate it at the first section in the following
-        # page
-        for anchor in comment["anchorRefExpanded"]:
-            if anchor.startswith(section_prefix):
-                return int(anchor.split(self._section_splitter())[1]) - 1
-
     def _add_second_level_comments_to_result(self, secondary_api_response, sections):
         if "commentary" not in secondary_api_response:
             return
 
-        section_prefix = f"{secondary_api_response['ref']}:",
+        section_anchors = SectionAnchors(
+            f"{secondary_api_response['ref']}:", self._section_splitter())
         first_level_commentary_name = f"{secondary_api_response['commentator']}"
         for comment in secondary_api_response.get("commentary", []):
             self._add_second_level_comment_to_result(
-                comment, sections, section_prefix, first_level_commentary_name)
+                comment, sections, section_anchors, first_level_commentary_name)
 
     def _add_second_level_comment_to_result(
-            self, comment, sections, section_prefix, first_level_commentary_name):
-        section = self._find_matching_section_index(comment, section_prefix)
+            self, comment, sections, section_anchors, first_level_commentary_name):
+        section = section_anchors.section_index(comment)
 
         if section is None or section >= len(sections):
             self._print("Unplaceable second level comment:",
@@ -219,17 +568,20 @@ class AbstractApiRequestHandler(object):
 
 # TODO: rename this to be Gemara related
 class ApiRequestHandler(AbstractApiRequestHandler):
-    async def _make_requests(self, masechet, amud):
-        return await asyncio.gather(
+    def _make_requests(self, masechet, amud):
+        return [
             self._request_maker.request_amud(f"{masechet}.{amud}"),
             self._request_maker.request_amud(f"Rashi_on_{masechet}.{amud}"),
             self._request_maker.request_amud(f"Tosafot_on_{masechet}.{amud}"),
-        )
+        ]
 
     # TODO: remove name alias
     def amud_api_request(self, masechet, amud):
         return self.handle_request(masechet, amud)
 
+    async def amud_api_request_async(self, masechet, amud):
+        return await self.handle_request_async(masechet, amud)
+
     def _make_id(self, masechet, amud):
         return amud
 
@@ -264,7 +616,7 @@ class ApiRequestHandler(AbstractApiRequestHandler):
 
     def _resolve_duplicated_out_and_nested_comments(self, section):
         commentary = section["commentary"]
-        top_level_comments_by_ref = {comment.ref: comment for comment in commentary.comments}
+        top_level_comments_by_ref = dict(commentary.comments_by_ref)
         for nested_commentary_name, nested_commentary in commentary.nested_commentaries.items():
             for nested_comment in nested_commentary.comments:
                 top_level_comment = top_level_comments_by_ref.get(nested_comment.ref)
@@ -327,13 +679,59 @@ def _strip_possible_prefix(text, prefix):
 
 SHULCHAN_ARUKH_HEADERS = {}
 with open("precomputed_texts/shulchan_arukh_headings.json", "r") as f:
-    import json
     SHULCHAN_ARUKH_HEADERS = json.load(f)
 
+def _format_comment_hebrew(hebrew, english_name):
+    if english_name == "Otzar Laazei Rashi":
+        hebrew = format_otzar_laazei_rashi(hebrew)
+
+    hebrew = bold_diburei_hamatchil(hebrew, english_name)
+    return _COMMENT_HEBREW_TRANSFORMATIONS.process(hebrew, english_name=english_name)
+
+def _format_comment_english(english, english_name):
+    if english_name == "Jastrow":
+        return _JASTROW_ENGLISH_TRANSFORMATIONS.process(english)
+    return standard_english_transformations(english)
+
+def _formatted_text_length(value):
+    if type(value) == str:
+        return len(value)
+    return sum(map(_formatted_text_length, value))
+
+# Many comments repeat across amudim and commentaries (i.e. Jastrow entries for common words, or
+# Rashi that spans two amudim), so their formatted text is memoized by its content. The size is
+# approximated by the length of the text, since comments vary from a word to many pages.
+comment_formatting_cache = LruMemo(
+    maxsize=int(float(os.environ.get("COMMENT_FORMATTING_CACHE_MAX_MB", 32)) * 1e6),
+    getsizeof=_formatted_text_length)
+
+def _memoized_formatting(format_fn, text, english_name):
+    key = hashlib.blake2b(
+        json.dumps([format_fn.__name__, text, english_name, FORMATTER_VERSION],
+                   ensure_ascii=False).encode("utf-8"),
+        digest_size=16).digest()
+    return comment_formatting_cache.get(key, lambda: format_fn(text, english_name))
+
+
+def _same_if_equal(value, other):
+    return other if value == other else value
+
+
 class Comment(object):
     """Represents a single comment on a text.
     """
 
+    __slots__ = (
+        "hebrew",
+        "english",
+        "ref",
+        "source_ref",
+        "source_he_ref",
+        "talmud_page_link",
+        "english_name",
+        "subtitle",
+    )
+
     @staticmethod
     def create(sefaria_comment, english_name):
         hebrew = sefaria_comment["he"]
@@ -344,38 +742,28 @@ class Comment(object):
             # TODO: this may no longer happen anymore
             english = ""
 
-        if english_name == "Otzar Laazei Rashi":
-            hebrew = format_otzar_laazei_rashi(hebrew)
-
-        hebrew = bold_diburei_hamatchil(hebrew, english_name)
-        for processor in [
-                HebrewSmallToEmphasisTagTranslator,
-                CommentaryPrefixStripper,
-                CommentaryParenthesesTransformer,
-                ImageNumberingFormatter]:
-            hebrew = processor.process(hebrew, english_name=english_name)
-
-        english = standard_english_transformations(english)
-        if english_name == "Jastrow":
-            english = JastrowReformatter.process(english)
+        hebrew = _memoized_formatting(_format_comment_hebrew, hebrew, english_name)
+        english = _memoized_formatting(_format_comment_english, english, english_name)
 
         comment = Comment()
 
         comment.hebrew = hebrew
         comment.english = english
         comment.ref = sefaria_comment["ref"]
-        comment.source_ref = sefaria_comment["sourceRef"]
+        # These are almost always the same string, but are separate copies after JSON parsing
+        comment.source_ref = _same_if_equal(sefaria_comment["sourceRef"], comment.ref)
         comment.source_he_ref = sefaria_comment["sourceHeRef"]
 
         masechet_ref = _masechet_ref(comment.source_ref)
         if english_name == "Mesorat Hashas" and masechet_ref:
-            comment.source_ref = strip_ref_segment_number(comment.source_ref)
-            comment.source_he_ref = strip_ref_segment_number(comment.source_he_ref)
-            comment.talmud_page_link = masechet_ref.to_url_pathname()
+            # Many Mesorat Hashas comments reference the same amud
+            comment.source_ref = sys.intern(strip_ref_segment_number(comment.source_ref))
+            comment.source_he_ref = sys.intern(strip_ref_segment_number(comment.source_he_ref))
+            comment.talmud_page_link = sys.intern(masechet_ref.to_url_pathname())
         else:
             comment.source_he_ref = strip_ref_quotation_marks(comment.source_he_ref)
             comment.talmud_page_link = None
-        comment.english_name = english_name
+        comment.english_name = sys.intern(english_name)
 
         comment.subtitle = None
         if english_name == "Shulchan Arukh":
@@ -407,22 +795,39 @@ class Commentary(object):
     """Maintains the state of all comments on a particular section.
     """
 
+    __slots__ = (
+        "seen_refs",
+        "comments_by_ref",
+        "comment_counts_by_english_name",
+        "nested_commentaries",
+    )
+
     def create():
         commentary = Commentary()
+        # Every ref that has been added, even if it was later removed, so that it isn't added again
+        commentary.seen_refs = set()
+        # The current comments, in the order that they were added
         commentary.comments_by_ref = {}
-        commentary.comments = []
+        commentary.comment_counts_by_english_name = {}
         commentary.nested_commentaries = {}
         return commentary
 
+    @property
+    def comments(self):
+        """A snapshot of the current comments, which remains unchanged if comments are removed."""
+        return list(self.comments_by_ref.values())
+
     def add_comment(self, comment):
-        if comment.ref in self.comments_by_ref:
+        if comment.ref in self.seen_refs:
             return
-        self.comments_by_ref[comment.ref] = True
+        self.seen_refs.add(comment.ref)
 
-        self.comments.append(comment)
+        self.comments_by_ref[comment.ref] = comment
+        counts = self.comment_counts_by_english_name
+        counts[comment.english_name] = counts.get(comment.english_name, 0) + 1
 
     def add_nested_comment(self, parent_commentary_name, comment):
-        if not any(map(lambda x: x.english_name == parent_commentary_name, self.comments)):
+        if not self.comment_counts_by_english_name.get(parent_commentary_name):
             return False
         if parent_commentary_name not in self.nested_commentaries:
             self.nested_commentaries[parent_commentary_name] = Commentary.create()
@@ -430,7 +835,9 @@ class Commentary(object):
         return True
 
     def remove_comment_with_ref(self, ref):
-        self.comments = list(filter(lambda x: x.ref != ref, self.comments))
+        comment = self.comments_by_ref.pop(ref, None)
+        if comment:
+            self.comment_counts_by_english_name[comment.english_name] -= 1
 
     def to_dict(self):
         result = {}
@@ -456,6 +863,10 @@ class ApiException(Exception):
         self.http_status = http_status
         self.internal_code = internal_code
 
+    def __reduce__(self):
+        # So that it can be raised from a formatting process
+        return (ApiException, (self.message, self.http_status, self.internal_code))
+
 # TODO: Sync commentaries data and expose it as a route as a JS file
 _COMMENTARIES = [
     {
@@ -541,16 +952,40 @@ _COMMENTARIES = [
     }
 ]
 
-def _has_matching_property(first, second, property_name):
-    return property_name in first and \
-        property_name in second and \
-        first[property_name] == second[property_name]
+def _first_index_by_property(property_name):
+    indices = {}
+    for index, kind in enumerate(_COMMENTARIES):
+        if property_name in kind:
+            indices.setdefault(kind[property_name], index)
+    return indices
+
+_COMMENTARY_INDEX_BY_ENGLISH_NAME = _first_index_by_property("englishName")
+_COMMENTARY_INDEX_BY_CATEGORY = _first_index_by_property("category")
+_COMMENTARY_INDEX_BY_TYPE = _first_index_by_property("type")
+
+# Matches at the start of every name, and tries each englishNamePattern in order as if with
+# search(). The empty group that follows the first pattern that is found names its commentary.
+_COMMENTARY_ENGLISH_NAME_PATTERNS = re.compile("|".join(
+    f"(?=[\\s\\S]*?(?:{kind['englishNamePattern'].pattern}))(?P<commentary_{index}>)"
+    for index, kind in enumerate(_COMMENTARIES)
+    if "englishNamePattern" in kind))
+
+@functools.lru_cache(maxsize=1024)
+def _matching_commentary_kind_index(name, category, comment_type):
+    indices = [
+        _COMMENTARY_INDEX_BY_ENGLISH_NAME.get(name),
+        _COMMENTARY_INDEX_BY_CATEGORY.get(category),
+        _COMMENTARY_INDEX_BY_TYPE.get(comment_type),
+    ]
+    pattern_match = _COMMENTARY_ENGLISH_NAME_PATTERNS.match(name)
+    if pattern_match:
+        indices.append(int(pattern_match.lastgroup[len("commentary_"):]))
+    indices = [index for index in indices if index is not None]
+    return min(indices) if indices else None
 
 def _matching_commentary_kind(comment):
-    name = comment["collectiveTitle"]["en"]
-    for kind in _COMMENTARIES:
-        if name == kind["englishName"] or \
-           _has_matching_property(comment, kind, "category") or \
-           _has_matching_property(comment, kind, "type") or \
-           "englishNamePattern" in kind and kind["englishNamePattern"].findall(name):
-            return kind
+    """Returns the first of _COMMENTARIES whose englishName, category, or type is the same as
+    `comment`'s, or whose englishNamePattern is found in its name."""
+    index = _matching_commentary_kind_index(
+        comment["collectiveTitle"]["en"], comment.get("category"), comment.get("type"))
+    return None if index is None else _COMMENTARIES[index]
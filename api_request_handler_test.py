@@ -1,6 +1,7 @@
 from util.json_files import write_json
 import api_request_handler
 import argparse
+import asyncio
 import json
 
 def input_file_path(ref):
@@ -58,6 +59,11 @@ def doTest():
         if actual != expected:
             raise AssertionError("Not equal for %s" % test_amud)
 
+        actual_async = json.loads(json.dumps(asyncio.run(
+            request_handler.amud_api_request_async(test_amud.masechet, test_amud.amud))))
+        if actual_async != expected:
+            raise AssertionError("Not equal for %s (async)" % test_amud)
+
 class RecordingRequestMaker(object):
     def __init__(self):
         self._real_request_maker = api_request_handler.RealRequestMaker()
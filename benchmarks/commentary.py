@@ -0,0 +1,87 @@
+"""Measures the Commentary bookkeeping for the comments of Berakhot 34b.
+
+The comments are created once, and then added to their sections, deduplicated, and serialized
+repeatedly. The "one section" run simulates a heavily commented section: --copies of every comment
+are placed on the same section, and each is also added as a nested comment on Rashi.
+
+Usage: python -m benchmarks.commentary [--repetitions 20] [--copies 10]
+"""
+
+from api_request_handler import ApiRequestHandler
+from api_request_handler import Comment
+from api_request_handler import Commentary
+from api_request_handler import SectionAnchors
+from api_request_handler import _matching_commentary_kind
+from benchmarks.recorded_responses import recorded_response
+import argparse
+import copy
+import json
+import time
+
+def _load(ref):
+    return json.loads(recorded_response(ref))
+
+def _placed_comments(sefaria_json, section_prefix):
+    """Returns (section index, Comment) for each comment in `sefaria_json` that has a section."""
+    section_anchors = SectionAnchors(section_prefix, ":")
+    placed = []
+    for comment in sefaria_json.get("commentary", []):
+        kind = _matching_commentary_kind(comment)
+        section = section_anchors.section_index(comment)
+        if kind and section is not None and (comment["he"] or comment["text"]):
+            placed.append((section, Comment.create(comment, kind["englishName"])))
+    return placed
+
+def _copy_with_ref(comment, ref):
+    comment = copy.copy(comment)
+    comment.ref = ref
+    return comment
+
+def _run(handler, section_count, comments, nested_comments):
+    sections = [{"commentary": Commentary.create()} for _ in range(section_count)]
+    for section, comment in comments:
+        sections[section]["commentary"].add_comment(comment)
+    for section, parent_commentary_name, comment in nested_comments:
+        sections[section]["commentary"].add_nested_comment(parent_commentary_name, comment)
+    for section in sections:
+        handler._resolve_duplicated_out_and_nested_comments(section)
+        section["commentary"].to_dict()
+
+def _benchmark(name, handler, section_count, comments, nested_comments, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        _run(handler, section_count, comments, nested_comments)
+    elapsed = (time.perf_counter() - start) / repetitions
+    print(f"{name:>12}: {len(comments)} comments, {len(nested_comments)} nested comments, "
+          f"{1000 * elapsed:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repetitions", type=int, default=20)
+    parser.add_argument("--copies", type=int, default=10)
+    args = parser.parse_args()
+
+    handler = ApiRequestHandler(request_maker=None, print_function=lambda *args: None)
+    main_json = _load("Berakhot.34b")
+    comments = _placed_comments(main_json, f"{main_json['ref']}:")
+    nested_comments = []
+    for commentator in ("Rashi", "Tosafot"):
+        secondary_json = _load(f"{commentator}_on_Berakhot.34b")
+        nested_comments.extend(
+            (section, secondary_json["commentator"], comment)
+            for section, comment in _placed_comments(
+                secondary_json, f"{secondary_json['ref']}:"))
+
+    _benchmark("by section", handler, len(main_json["he"]), comments, nested_comments,
+               args.repetitions)
+    copies = [_copy_with_ref(comment, f"{comment.ref} ({i})")
+              for i in range(args.copies) for _, comment in comments]
+    _benchmark("one section", handler, 1,
+               [(0, comment) for comment in copies],
+               [(0, "Rashi", comment) for comment in copies],
+               args.repetitions)
+
+
+if __name__ == '__main__':
+    main()
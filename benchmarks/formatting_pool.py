@@ -0,0 +1,105 @@
+"""Measures how concurrent cache misses affect the latency of cache hits in the same process.
+
+One thread serves a stand-in for a cache hit every millisecond, and measures how late each one
+finishes. Meanwhile --concurrent-misses threads keep processing the test amudim, which respond
+instantly so that all of a miss's time is spent formatting. This is run with no misses, with misses
+formatted in-process, and with misses formatted in a pool of --processes processes. Comment
+formatting isn't memoized, so that every miss does all of the work.
+
+Usage: python -m benchmarks.formatting_pool [--seconds 5] [--concurrent-misses 4] [--processes 4]
+"""
+
+import os
+os.environ["COMMENT_FORMATTING_CACHE_MAX_MB"] = "0"
+
+from api_request_handler import ApiRequestHandler # noqa: E402
+from api_request_handler import CachedResponse # noqa: E402
+from benchmarks.recorded_responses import RECORDED_AMUDIM # noqa: E402
+from benchmarks.recorded_responses import recorded_response # noqa: E402
+from util.process_pool import ProcessPool # noqa: E402
+import argparse # noqa: E402
+import asyncio # noqa: E402
+import cachetools # noqa: E402
+import threading # noqa: E402
+import time # noqa: E402
+
+class _InstantRequestMaker(object):
+    def __init__(self):
+        self._responses = {}
+
+    async def request_amud(self, ref):
+        await asyncio.sleep(0)
+        if ref not in self._responses:
+            self._responses[ref] = recorded_response(ref)
+        return CachedResponse(self._responses[ref])
+
+
+_cache = cachetools.LRUCache(maxsize=16)
+_cache["Berakhot/2a"] = b"x" * 30000
+_cache_lock = threading.Lock()
+
+def _serve_cache_hit():
+    with _cache_lock:
+        return len(_cache["Berakhot/2a"])
+
+def _percentile(values, percentile):
+    return sorted(values)[min(len(values) - 1, int(len(values) * percentile))]
+
+def _run(name, handler, concurrent_misses, seconds):
+    stop = threading.Event()
+    misses = []
+
+    def _miss_loop(offset):
+        i = offset
+        while not stop.is_set():
+            handler.amud_api_request(*RECORDED_AMUDIM[i % len(RECORDED_AMUDIM)])
+            misses.append(1)
+            i += 1
+
+    threads = [threading.Thread(target=_miss_loop, args=(i,), daemon=True)
+               for i in range(concurrent_misses)]
+    for thread in threads:
+        thread.start()
+
+    hit_latencies = []
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        # Waiting for the GIL after waking up is part of the latency
+        scheduled = time.perf_counter() + 0.001
+        time.sleep(0.001)
+        _serve_cache_hit()
+        hit_latencies.append(time.perf_counter() - scheduled)
+
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    print(f"{name:>16}: cache hits p50 {1000 * _percentile(hit_latencies, 0.5):6.2f}ms, "
+          f"p99 {1000 * _percentile(hit_latencies, 0.99):6.2f}ms, "
+          f"max {1000 * max(hit_latencies):6.2f}ms; "
+          f"{len(misses) / seconds:5.1f} misses/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--seconds", type=float, default=5)
+    parser.add_argument("--concurrent-misses", type=int, default=4)
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    request_maker = _InstantRequestMaker()
+    print_function = lambda *args: None # noqa: E731
+    in_process = ApiRequestHandler(request_maker, print_function=print_function)
+    pool = ProcessPool(max_workers=args.processes)
+    pooled = ApiRequestHandler(request_maker, print_function=print_function, formatting_pool=pool)
+    # Start the workers before measuring
+    for _ in range(args.processes):
+        pooled.amud_api_request(*RECORDED_AMUDIM[0])
+
+    _run("no misses", in_process, 0, args.seconds)
+    _run("in-process", in_process, args.concurrent_misses, args.seconds)
+    _run(f"{args.processes} processes", pooled, args.concurrent_misses, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
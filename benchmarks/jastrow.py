@@ -0,0 +1,43 @@
+"""Measures how long it takes to format the Jastrow comments of each amud in test_data/.
+
+Usage: python -m benchmarks.jastrow [--repetitions 20]
+"""
+
+from api_request_handler import _JASTROW_ENGLISH_TRANSFORMATIONS
+from benchmarks.recorded_responses import RECORDED_AMUDIM
+from benchmarks.recorded_responses import recorded_response
+import argparse
+import json
+import time
+
+def _jastrow_comments_by_amud():
+    comments_by_amud = {}
+    for masechet, amud in RECORDED_AMUDIM:
+        commentary = json.loads(recorded_response(f"{masechet}.{amud}")).get("commentary", [])
+        comments = [
+            comment["text"] for comment in commentary
+            if comment.get("collectiveTitle", {}).get("en") == "Jastrow"]
+        if comments:
+            comments_by_amud[f"{masechet}.{amud}"] = comments
+    return comments_by_amud
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repetitions", type=int, default=20)
+    args = parser.parse_args()
+
+    total = 0
+    for amud, comments in _jastrow_comments_by_amud().items():
+        start = time.perf_counter()
+        for _ in range(args.repetitions):
+            for comment in comments:
+                _JASTROW_ENGLISH_TRANSFORMATIONS.process(comment, english_name="Jastrow")
+        elapsed = (time.perf_counter() - start) / args.repetitions
+        total += elapsed
+        print(f"{amud:>15}: {len(comments):3} comments, {1000 * elapsed:7.2f}ms/amud")
+    print(f"{'total':>15}: {1000 * total:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
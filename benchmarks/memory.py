@@ -0,0 +1,33 @@
+"""Measures the peak memory that is allocated while processing each amud in test_data/.
+
+The Sefaria responses are read before measuring, but parsing them is included. Comment formatting
+is memoized across amudim, so that memo is cleared before each amud.
+
+Usage: python -m benchmarks.memory
+"""
+
+from api_request_handler import ApiRequestHandler
+from api_request_handler import CachedResponse
+from api_request_handler import comment_formatting_cache
+from benchmarks.recorded_responses import RECORDED_AMUDIM
+from benchmarks.recorded_responses import recorded_amud_responses
+import tracemalloc
+
+
+def main():
+    handler = ApiRequestHandler(request_maker=None, print_function=lambda *args: None)
+    total = 0
+    for masechet, amud in RECORDED_AMUDIM:
+        responses = list(map(CachedResponse, recorded_amud_responses(masechet, amud)))
+        comment_formatting_cache.clear()
+        tracemalloc.start()
+        handler._process_sefaria_results(responses, masechet, amud)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        total += peak
+        print(f"{masechet + '.' + amud:>15}: {peak / 1024:8.1f}KiB peak")
+    print(f"{'mean':>15}: {total / len(RECORDED_AMUDIM) / 1024:8.1f}KiB peak")
+
+
+if __name__ == '__main__':
+    main()
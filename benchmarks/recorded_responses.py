@@ -0,0 +1,21 @@
+"""The Sefaria responses recorded in test_data/ for api_request_handler_test.py."""
+
+import os
+
+RECORDED_RESPONSES_DIR = "test_data/api_request_handler"
+
+# Each is (masechet, amud)
+RECORDED_AMUDIM = sorted(
+    tuple(name[:-len(".input.json")].rsplit(".", 1))
+    for name in os.listdir(RECORDED_RESPONSES_DIR)
+    if name.endswith(".input.json") and "_on_" not in name)
+
+def recorded_response(ref):
+    """Returns the text of the recorded response for `ref`, i.e. "Rashi_on_Berakhot.2a"."""
+    with open(f"{RECORDED_RESPONSES_DIR}/{ref}.input.json", "r") as input_file:
+        return input_file.read()
+
+def recorded_amud_responses(masechet, amud):
+    """Returns the texts of the main, Rashi and Tosafot responses for an amud."""
+    return [recorded_response(f"{prefix}{masechet}.{amud}")
+            for prefix in ("", "Rashi_on_", "Tosafot_on_")]
@@ -0,0 +1,111 @@
+"""Compares a per-request httpx client with RealRequestMaker's pooled client.
+
+A local stand-in for sefaria.org serves the recorded responses in test_data/. Each new connection
+sleeps for --handshake-ms before it is served, to simulate the TCP + TLS handshake cost of talking
+to the real server.
+
+Usage: python -m benchmarks.request_maker [--handshake-ms 60] [--amudim 20]
+"""
+
+from api_request_handler import RealRequestMaker
+from benchmarks.recorded_responses import RECORDED_AMUDIM
+from benchmarks.recorded_responses import recorded_response
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from urllib.parse import urlparse
+import argparse
+import asyncio
+import httpx
+import threading
+import time
+
+class _StandInSefariaHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    handshake_seconds = 0
+    connection_count = 0
+    _count_lock = threading.Lock()
+
+    def setup(self):
+        super().setup()
+        with self._count_lock:
+            _StandInSefariaHandler.connection_count += 1
+        time.sleep(self.handshake_seconds)
+
+    def do_GET(self):
+        ref = urlparse(self.path).path[len("/api/texts/"):]
+        body = recorded_response(ref).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _UnpooledRequestMaker(object):
+    """The previous implementation of RealRequestMaker, which creates a client for every request."""
+
+    def __init__(self, base_url):
+        self._base_url = base_url
+
+    async def request_amud(self, ref):
+        async with httpx.AsyncClient() as client:
+            return await client.get(f"{self._base_url}/api/texts/{ref}")
+
+
+async def _fetch_amud(request_maker, amud):
+    """Fetches an amud, and its Rashi and Tosafot, the same way that ApiRequestHandler does."""
+    return await asyncio.gather(
+        request_maker.request_amud(amud),
+        request_maker.request_amud(f"Rashi_on_{amud}"),
+        request_maker.request_amud(f"Tosafot_on_{amud}"),
+    )
+
+
+def _fetch_amudim(request_maker, amudim):
+    latencies = []
+    for amud in amudim:
+        start = time.perf_counter()
+        asyncio.run(_fetch_amud(request_maker, amud))
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def _report(name, latencies, connection_count):
+    latencies = sorted(latencies)
+    mean_ms = 1000 * sum(latencies) / len(latencies)
+    median_ms = 1000 * latencies[len(latencies) // 2]
+    print(f"{name:>10}: mean {mean_ms:7.1f}ms/amud, median {median_ms:7.1f}ms/amud, "
+          f"{connection_count} connections for {3 * len(latencies)} requests")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--handshake-ms", type=float, default=60)
+    parser.add_argument("--amudim", type=int, default=20)
+    args = parser.parse_args()
+
+    _StandInSefariaHandler.handshake_seconds = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StandInSefariaHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    amudim = [
+        "%s.%s" % RECORDED_AMUDIM[i % len(RECORDED_AMUDIM)] for i in range(args.amudim)]
+    for name, request_maker in (
+            ("unpooled", _UnpooledRequestMaker(base_url)),
+            # The stand-in server doesn't speak TLS, and therefore can't negotiate HTTP/2 via ALPN
+            ("pooled", RealRequestMaker(base_url=base_url, http2=False)),
+    ):
+        _StandInSefariaHandler.connection_count = 0
+        latencies = _fetch_amudim(request_maker, amudim)
+        _report(name, latencies, _StandInSefariaHandler.connection_count)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
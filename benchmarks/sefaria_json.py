@@ -0,0 +1,46 @@
+"""Compares json.loads() with parse_sefaria_response() on the Sefaria responses in test_data/.
+
+Each amud is the main response along with its Rashi and Tosafot responses. The peak is measured
+with tracemalloc, and doesn't include the response text itself.
+
+Usage: python -m benchmarks.sefaria_json [--repetitions 10]
+"""
+
+from api_request_handler import parse_sefaria_response
+from benchmarks.recorded_responses import RECORDED_AMUDIM
+from benchmarks.recorded_responses import recorded_amud_responses
+import argparse
+import json
+import time
+import tracemalloc
+
+def _measure(parse, texts, repetitions):
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        list(map(parse, texts))
+    elapsed = (time.perf_counter() - start) / repetitions
+
+    tracemalloc.start()
+    list(map(parse, texts))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repetitions", type=int, default=10)
+    args = parser.parse_args()
+
+    for masechet, amud in RECORDED_AMUDIM:
+        texts = recorded_amud_responses(masechet, amud)
+        results = []
+        for parse in (json.loads, parse_sefaria_response):
+            elapsed, peak = _measure(parse, texts, args.repetitions)
+            results.append(f"{1000 * elapsed:6.2f}ms {peak / 1024:7.1f}KiB")
+        print(f"{masechet + '.' + amud:>15}: json.loads {results[0]}, "
+              f"parse_sefaria_response {results[1]}")
+
+
+if __name__ == '__main__':
+    main()
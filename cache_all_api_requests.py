@@ -1,37 +1,253 @@
-import argparse
-import api_request_handler
-import os
-import traceback
+"""Processes every amud of Shas and writes the results to cached_outputs/api_request_handler/.
+
+Amudim are processed concurrently, and requests to Sefaria are rate limited. Progress is recorded in
+a manifest, so an interrupted run picks up where it left off.
+"""
+
 from api_request_handler import ApiException
+from api_request_handler import ApiRequestHandler
+from api_request_handler import CachingRequestMaker
+from api_request_handler import FORMATTER_VERSION
+from api_request_handler import RealRequestMaker
+from api_request_handler import sefaria_response_cache
 from masechtot import MASECHTOT
+from masechtot import Masechtot
 from masechtot import next_amud
 from util.json_files import write_json
+from util.process_pool import ProcessPool
+from util.token_bucket import TokenBucket
+import argparse
+import asyncio
+import httpx
+import json
+import os
+import random
+import time
+import traceback
+
+_OUTPUT_DIRECTORY = "cached_outputs/api_request_handler"
+_MANIFEST_PATH = "cached_outputs/cache_all_api_requests.manifest.json"
+
+_MAX_BACKOFF_SECONDS = 60
+
+
+def _write_json_atomically(path, data):
+    """Writes to a temporary file first, so that an interruption never leaves a partial file."""
+    temporary_path = f"{path}.tmp"
+    write_json(temporary_path, data)
+    os.replace(temporary_path, path)
+
+
+class RateLimitedRequestMaker(object):
+    """Waits for a token from `token_bucket` before each request."""
+
+    def __init__(self, request_maker, token_bucket):
+        self._request_maker = request_maker
+        self._token_bucket = token_bucket
+
+    async def request_amud(self, ref, headers=None):
+        await self._token_bucket.acquire()
+        return await self._request_maker.request_amud(ref, headers=headers)
+
+
+class Manifest(object):
+    """The outcome of every amud that has been processed, keyed by "masechet/amud".
+
+    Written at most every `save_interval_seconds`.
+    """
+
+    def __init__(self, path, save_interval_seconds=5):
+        self._path = path
+        self._save_interval_seconds = save_interval_seconds
+        self._last_saved_at = 0
+        self.entries = {}
+        if os.path.exists(path):
+            with open(path, "r") as manifest_file:
+                self.entries = json.load(manifest_file)
+
+    def get(self, key):
+        return self.entries.get(key, {})
+
+    def record(self, key, **entry):
+        self.entries[key] = entry
+        if time.monotonic() - self._last_saved_at >= self._save_interval_seconds:
+            self.save()
+
+    def save(self):
+        _write_json_atomically(self._path, self.entries)
+        self._last_saved_at = time.monotonic()
+
+
+class MasechetProgress(object):
+    def __init__(self, masechet, total):
+        self.masechet = masechet
+        self.total = total
+        self.written = 0
+        self.skipped = 0
+        self.failed = 0
 
-parser = argparse.ArgumentParser(description='Test')
-parser.add_argument("--overwrite", action="store_const", const=True)
-args = parser.parse_args()
+    def finished_count(self):
+        return self.written + self.skipped + self.failed
 
-request_handler = api_request_handler.ApiRequestHandler(
-    api_request_handler.RealRequestMaker(),
-    print_function = lambda *args: None)
-for masechet in MASECHTOT:
+    def is_finished(self):
+        return self.finished_count() == self.total
+
+    def __str__(self):
+        return (f"{self.masechet.canonical_name}: {self.finished_count()}/{self.total} "
+                f"({self.written} written, {self.skipped} skipped, {self.failed} failed)")
+
+
+def _amudim(masechet):
     amud = masechet.start
     while True:
-        file_path = f"cached_outputs/api_request_handler/{masechet.canonical_name}.{amud}.json"
-        if args.overwrite or not os.path.exists(file_path):
-            try:
-                write_json(file_path,
-                           request_handler.amud_api_request(masechet.canonical_name, amud))
-            except ApiException as e:
-                print(f"ApiException in {masechet.canonical_name} {amud}: {e.message}")
-                if e.internal_code == ApiException.SEFARIA_HTTP_ERROR:
-                    continue
-            except Exception:
-                print(f"Exception in {masechet.canonical_name} {amud}")
-                traceback.print_exc()
-                continue
+        yield amud
         if amud == masechet.end:
-            break
+            return
         amud = next_amud(amud)
-    print(f"Finished {masechet.canonical_name}")
-print("Finished!")
+
+
+def _is_retryable(exception):
+    if isinstance(exception, ApiException):
+        return exception.internal_code == ApiException.SEFARIA_HTTP_ERROR
+    return isinstance(exception, httpx.HTTPError)
+
+
+class Crawler(object):
+    def __init__(self, request_handler, manifest, args):
+        self._request_handler = request_handler
+        self._manifest = manifest
+        self._args = args
+        self._semaphore = None
+
+    def _should_skip(self, key, output_path):
+        if not os.path.exists(output_path):
+            return False
+        if not self._args.overwrite:
+            return True
+        # With --overwrite, only outputs that were written by this version of the formatting code
+        # are kept, so that an interrupted run can be resumed.
+        entry = self._manifest.get(key)
+        return entry.get("status") == "done" and entry.get("formatterVersion") == FORMATTER_VERSION
+
+    async def _process_amud(self, masechet, amud, progress):
+        key = f"{masechet.canonical_name}/{amud}"
+        output_path = f"{_OUTPUT_DIRECTORY}/{masechet.canonical_name}.{amud}.json"
+        if self._should_skip(key, output_path):
+            progress.skipped += 1
+            return
+
+        async with self._semaphore:
+            for attempt in range(self._args.retries + 1):
+                try:
+                    result = await self._request_handler.amud_api_request_async(
+                        masechet.canonical_name, amud)
+                    break
+                except Exception as e:
+                    if attempt < self._args.retries and _is_retryable(e):
+                        await asyncio.sleep(
+                            min(_MAX_BACKOFF_SECONDS, 2 ** attempt) * random.uniform(0.5, 1))
+                        continue
+                    if isinstance(e, ApiException):
+                        print(f"ApiException in {masechet.canonical_name} {amud}: {e.message}")
+                    else:
+                        print(f"Exception in {masechet.canonical_name} {amud}")
+                        traceback.print_exc()
+                    progress.failed += 1
+                    self._manifest.record(
+                        key, status="failed", attempts=attempt + 1, error=repr(e),
+                        formatterVersion=FORMATTER_VERSION)
+                    return
+
+        _write_json_atomically(output_path, result)
+        progress.written += 1
+        self._manifest.record(
+            key, status="done", attempts=attempt + 1, formatterVersion=FORMATTER_VERSION)
+
+    async def _process_masechet(self, masechet, progress):
+        await asyncio.gather(*[
+            self._process_amud(masechet, amud, progress) for amud in _amudim(masechet)])
+        print(f"Finished {progress}")
+
+    async def _report_progress(self, all_progress):
+        start = time.monotonic()
+        while True:
+            await asyncio.sleep(self._args.progress_seconds)
+            in_progress = [
+                progress for progress in all_progress
+                if progress.finished_count() and not progress.is_finished()]
+            finished = sum(progress.finished_count() for progress in all_progress)
+            total = sum(progress.total for progress in all_progress)
+            print(f"{finished}/{total} amudim after {time.monotonic() - start:.0f}s. "
+                  + "; ".join(map(str, in_progress)))
+
+    async def crawl(self, masechtot):
+        # Created here so that it's bound to the loop that asyncio.run() created
+        self._semaphore = asyncio.Semaphore(self._args.concurrency)
+        all_progress = [
+            MasechetProgress(masechet, len(list(_amudim(masechet)))) for masechet in masechtot]
+        reporter = asyncio.ensure_future(self._report_progress(all_progress))
+        try:
+            await asyncio.gather(*[
+                self._process_masechet(progress.masechet, progress)
+                for progress in all_progress])
+        finally:
+            reporter.cancel()
+            self._manifest.save()
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "--overwrite", action="store_const", const=True,
+        help="Rewrite outputs that were written by a different version of the formatting code.")
+    parser.add_argument(
+        "--offline", action="store_const", const=True,
+        help="Reprocess the cached Sefaria responses without revalidating them. Use with "
+        "--overwrite after changing formatting code.")
+    parser.add_argument(
+        "--masechtot", nargs="+", metavar="MASECHET",
+        help="Only process these masechtot. Defaults to all of them.")
+    parser.add_argument(
+        "--concurrency", type=int, default=8, help="How many amudim to process at once.")
+    parser.add_argument(
+        "--requests-per-second", type=float, default=5,
+        help="The average rate of requests to Sefaria. Cached responses don't count.")
+    parser.add_argument(
+        "--retries", type=int, default=4,
+        help="How many times to retry an amud after an HTTP error, with exponential backoff.")
+    parser.add_argument(
+        "--formatting-processes", type=int, default=0,
+        help="Format amudim in this many worker processes, to use more than one CPU.")
+    parser.add_argument("--progress-seconds", type=float, default=30)
+    return parser.parse_args()
+
+
+def _selected_masechtot(names):
+    if not names:
+        return MASECHTOT
+    canonical_names = set(map(Masechtot().canonical_masechet_name, names))
+    return [masechet for masechet in MASECHTOT if masechet.canonical_name in canonical_names]
+
+
+def main():
+    args = _parse_args()
+    masechtot = _selected_masechtot(args.masechtot)
+    os.makedirs(_OUTPUT_DIRECTORY, exist_ok=True)
+
+    request_handler = ApiRequestHandler(
+        CachingRequestMaker(
+            RateLimitedRequestMaker(
+                RealRequestMaker(),
+                TokenBucket(rate=args.requests_per_second, capacity=args.concurrency)),
+            sefaria_response_cache("cached_outputs/sefaria_responses.sqlite3"),
+            max_age_seconds = None if args.offline else 7 * 24 * 60 * 60),
+        print_function = lambda *args: None,
+        formatting_pool = (
+            ProcessPool(args.formatting_processes) if args.formatting_processes > 0 else None))
+
+    asyncio.run(Crawler(request_handler, Manifest(_MANIFEST_PATH), args).crawl(masechtot))
+    print("Finished!")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+from api_request_handler import ApiException
+from api_request_handler import FORMATTER_VERSION
+import argparse
+import asyncio
+import cache_all_api_requests
+import collections
+import contextlib
+import httpx
+import io
+import json
+import os
+import shutil
+import tempfile
+
+FakeMasechet = collections.namedtuple("FakeMasechet", ["canonical_name", "start", "end"])
+BERAKHOT = FakeMasechet("Berakhot", "2a", "3a")
+
+def sefaria_http_error():
+    return ApiException("Sefaria is down", 500, ApiException.SEFARIA_HTTP_ERROR)
+
+def unequal_length_error():
+    return ApiException("Unequal lengths", 500, ApiException.UNEQAUL_HEBREW_ENGLISH_LENGTH)
+
+
+class FakeRequestHandler(object):
+    """Raises the queued exceptions for each amud, and then succeeds."""
+
+    def __init__(self, failures):
+        self._failures = failures
+        self.requests = []
+
+    async def amud_api_request_async(self, masechet, amud):
+        self.requests.append(amud)
+        failures = self._failures.get(amud, [])
+        if failures:
+            raise failures.pop(0)
+        return {"amud": amud}
+
+
+def assert_equal(expected, actual):
+    if expected != actual:
+        raise AssertionError(f"Expected {expected}, got {actual}")
+
+def crawl(directory, request_handler, overwrite):
+    args = argparse.Namespace(overwrite=overwrite, retries=2, concurrency=2, progress_seconds=60)
+    manifest_path = os.path.join(directory, "manifest.json")
+    crawler = cache_all_api_requests.Crawler(
+        request_handler, cache_all_api_requests.Manifest(manifest_path), args)
+    # Failures are printed along with their tracebacks
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        asyncio.run(crawler.crawl([BERAKHOT]))
+    with open(manifest_path, "r") as manifest_file:
+        return json.load(manifest_file)
+
+def output_path(amud):
+    return os.path.join(cache_all_api_requests._OUTPUT_DIRECTORY, f"Berakhot.{amud}.json")
+
+def manifest_summary(manifest):
+    return {key: (entry["status"], entry["attempts"]) for key, entry in manifest.items()}
+
+
+directory = tempfile.mkdtemp()
+try:
+    cache_all_api_requests._OUTPUT_DIRECTORY = directory
+    cache_all_api_requests._MAX_BACKOFF_SECONDS = 0
+
+    handler = FakeRequestHandler({
+        "2a": [sefaria_http_error()],
+        "2b": [unequal_length_error()],
+        "3a": [httpx.NetworkError("offline")] * 3,
+    })
+    manifest = crawl(directory, handler, overwrite=False)
+    # HTTP errors are retried, up to --retries times, but other errors aren't
+    assert_equal(
+        {"Berakhot/2a": ("done", 2), "Berakhot/2b": ("failed", 1), "Berakhot/3a": ("failed", 3)},
+        manifest_summary(manifest))
+    assert_equal(["2a", "2b", "3a"], sorted(set(handler.requests)))
+    assert_equal(1, handler.requests.count("2b"))
+    assert_equal({FORMATTER_VERSION}, {entry["formatterVersion"] for entry in manifest.values()})
+    assert "ApiException" in manifest["Berakhot/2b"]["error"]
+    assert_equal(["2a"], [amud for amud in ("2a", "2b", "3a") if os.path.exists(output_path(amud))])
+    with open(output_path("2a"), "r") as output_file:
+        assert_equal({"amud": "2a"}, json.load(output_file))
+    assert_equal(["Berakhot.2a.json", "manifest.json"], sorted(os.listdir(directory)))
+
+    # A partial output that was left behind, even though the manifest records that 3a failed
+    with open(output_path("3a"), "w") as output_file:
+        output_file.write("{")
+
+    # Without --overwrite, every existing output is kept
+    handler = FakeRequestHandler({})
+    crawl(directory, handler, overwrite=False)
+    assert_equal(["2b"], handler.requests)
+
+    # With --overwrite, outputs that weren't written by this version of the formatting code are
+    # rewritten, and the rest are kept
+    manifest_path = os.path.join(directory, "manifest.json")
+    with open(manifest_path, "r") as manifest_file:
+        entries = json.load(manifest_file)
+    entries["Berakhot/2b"]["formatterVersion"] = "an older version"
+    with open(manifest_path, "w") as manifest_file:
+        json.dump(entries, manifest_file)
+
+    handler = FakeRequestHandler({})
+    manifest = crawl(directory, handler, overwrite=True)
+    assert_equal(["2b", "3a"], sorted(handler.requests))
+    assert_equal(
+        {"Berakhot/2a": ("done", 2), "Berakhot/2b": ("done", 1), "Berakhot/3a": ("done", 1)},
+        manifest_summary(manifest))
+    with open(output_path("3a"), "r") as output_file:
+        assert_equal({"amud": "3a"}, json.load(output_file))
+
+    # Once everything is done, a resumed run has nothing left to do
+    handler = FakeRequestHandler({})
+    crawl(directory, handler, overwrite=True)
+    assert_equal([], handler.requests)
+finally:
+    shutil.rmtree(directory)
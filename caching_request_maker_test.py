@@ -0,0 +1,109 @@
+from api_request_handler import CachingRequestMaker
+from api_request_handler import sefaria_response_cache
+import asyncio
+import httpx
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+
+class FakeResponse(object):
+    def __init__(self, text, status_code=200, headers=None):
+        self.text = text
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeRequestMaker(object):
+    def __init__(self):
+        self.responses = []
+        self.requests = []
+
+    async def request_amud(self, ref, headers=None):
+        self.requests.append((ref, headers))
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class BrokenCache(object):
+    def get_row(self, key):
+        raise sqlite3.OperationalError("database is locked")
+
+    def put_row(self, key, *values):
+        raise sqlite3.OperationalError("database is locked")
+
+
+def request(request_maker, ref):
+    return asyncio.run(request_maker.request_amud(ref)).text
+
+def assert_equal(expected, actual):
+    if expected != actual:
+        raise AssertionError(f"Expected {expected}, got {actual}")
+
+# The errors that are logged are expected
+logging.disable(logging.CRITICAL)
+
+directory = tempfile.mkdtemp()
+try:
+    cache = sefaria_response_cache(os.path.join(directory, "sefaria_responses.sqlite3"))
+    fake = FakeRequestMaker()
+    fresh = CachingRequestMaker(fake, cache, max_age_seconds=60 * 60)
+    always_stale = CachingRequestMaker(fake, cache, max_age_seconds=-1)
+    never_stale = CachingRequestMaker(fake, cache, max_age_seconds=None)
+
+    fake.responses.append(
+        FakeResponse("first", headers={"ETag": '"1"', "Last-Modified": "Sun, 18 Oct 2026"}))
+    assert_equal("first", request(fresh, "Berakhot 2a"))
+    assert_equal([("Berakhot 2a", {})], fake.requests)
+
+    # Responses younger than max_age_seconds are used without making a request
+    assert_equal("first", request(fresh, "Berakhot 2a"))
+    assert_equal("first", request(never_stale, "Berakhot 2a"))
+    assert_equal(1, len(fake.requests))
+
+    # Stale responses are revalidated, and reused if Sefaria responds with a 304
+    fake.responses.append(FakeResponse("", status_code=304))
+    assert_equal("first", request(always_stale, "Berakhot 2a"))
+    assert_equal(
+        ("Berakhot 2a", {"If-None-Match": '"1"', "If-Modified-Since": "Sun, 18 Oct 2026"}),
+        fake.requests[-1])
+
+    # A changed response replaces the cached one
+    fake.responses.append(FakeResponse("second", headers={"ETag": '"2"'}))
+    assert_equal("second", request(always_stale, "Berakhot 2a"))
+    fake.responses.append(FakeResponse("", status_code=304))
+    assert_equal("second", request(always_stale, "Berakhot 2a"))
+    assert_equal(("Berakhot 2a", {"If-None-Match": '"2"'}), fake.requests[-1])
+
+    # Errors aren't cached
+    fake.responses.append(FakeResponse("error", status_code=500))
+    assert_equal("error", request(fresh, "Berakhot 2b"))
+    fake.responses.append(FakeResponse("third"))
+    assert_equal("third", request(fresh, "Berakhot 2b"))
+    assert_equal(("Berakhot 2b", {}), fake.requests[-1])
+
+    # Stale responses are used if they can't be revalidated, and are revalidated again next time
+    fake.responses.append(FakeResponse("error", status_code=503))
+    assert_equal("third", request(always_stale, "Berakhot 2b"))
+    fake.responses.append(httpx.NetworkError("offline"))
+    assert_equal("third", request(always_stale, "Berakhot 2b"))
+    fake.responses.append(FakeResponse("fourth"))
+    assert_equal("fourth", request(always_stale, "Berakhot 2b"))
+
+    # Without a cached response, errors are returned as-is
+    fake.responses.append(httpx.NetworkError("offline"))
+    try:
+        request(fresh, "Berakhot 3a")
+        raise AssertionError("Expected an httpx.NetworkError")
+    except httpx.NetworkError:
+        pass
+
+    # Errors from the cache are treated as cache misses
+    broken = CachingRequestMaker(fake, BrokenCache(), max_age_seconds=60 * 60)
+    fake.responses.append(FakeResponse("fifth"))
+    assert_equal("fifth", request(broken, "Berakhot 3a"))
+finally:
+    shutil.rmtree(directory)
@@ -0,0 +1,146 @@
+"""Packs the amudim in cached_outputs/api_request_handler/ into a single corpus file.
+
+The file has a fixed-size header, then each amud's compressed JSON, and then an index of where each
+amud is. server.py can serve the /api/ routes straight from a memory map of the file (see
+CORPUS_FILE), without making any requests to Sefaria.
+
+Usage: python corpus.py [--input cached_outputs/api_request_handler]
+                        [--output cached_outputs/corpus.bin] [--compression gzip]
+"""
+
+from api_request_handler import FORMATTER_VERSION
+from masechtot import Masechtot
+from util import compression
+import argparse
+import json
+import mmap
+import os
+import struct
+
+_MAGIC = b"TALMUDPG"
+
+# Bump when the layout of the file changes
+_FORMAT_VERSION = 1
+
+# magic, format version, payload encoding, FORMATTER_VERSION, index offset, index length
+_HEADER = struct.Struct("<8sI8s16sQQ")
+
+
+class CorpusFormatException(Exception):
+    pass
+
+
+def corpus_key(masechet, amud):
+    return f"{masechet}/{amud}"
+
+def encode_amud(amud_json, encoding):
+    """Compresses a processed amud the same way that server.py does before caching it."""
+    return compression.compress(
+        json.dumps(
+            amud_json, ensure_ascii=False, separators=(",", ":"), sort_keys=True).encode("utf-8"),
+        encoding)
+
+def _input_files(input_directory):
+    masechtot = Masechtot()
+    for name in sorted(os.listdir(input_directory)):
+        if not name.endswith(".json"):
+            continue
+        masechet, amud = name[:-len(".json")].rsplit(".", 1)
+        yield masechtot.canonical_masechet_name(masechet), amud, os.path.join(input_directory, name)
+
+def build_corpus(input_directory, output_path, encoding="gzip"):
+    """Writes every amud in `input_directory` to a corpus at `output_path`.
+
+    The file is written to a temporary path first and then renamed, so that servers that have the
+    previous version mapped can keep on reading it.
+
+    Returns the number of amudim that were written.
+    """
+    index = {}
+    temporary_path = f"{output_path}.tmp"
+    with open(temporary_path, "wb") as output_file:
+        output_file.write(b"\0" * _HEADER.size)
+        for masechet, amud, path in _input_files(input_directory):
+            with open(path, "r") as input_file:
+                compressed = encode_amud(json.load(input_file), encoding)
+            index[corpus_key(masechet, amud)] = (
+                output_file.tell(), len(compressed.data), compressed.content_hash)
+            output_file.write(compressed.data)
+
+        index_offset = output_file.tell()
+        index_bytes = json.dumps(index, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        output_file.write(index_bytes)
+
+        output_file.seek(0)
+        output_file.write(_HEADER.pack(
+            _MAGIC,
+            _FORMAT_VERSION,
+            encoding.encode("ascii"),
+            FORMATTER_VERSION.encode("ascii"),
+            index_offset,
+            len(index_bytes)))
+    os.replace(temporary_path, output_path)
+    return len(index)
+
+
+class Corpus(object):
+    """A read-only, memory-mapped corpus file.
+
+    Payloads are sliced from the map on each request, so the file's pages are shared (via the page
+    cache) by every process that opens it, and only the index is held in memory.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as corpus_file:
+            self._map = mmap.mmap(corpus_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._map) < _HEADER.size:
+            raise CorpusFormatException(f"{path} is too small to be a corpus")
+        (magic, format_version, encoding, formatter_version, index_offset, index_length) = (
+            _HEADER.unpack_from(self._map))
+        if magic != _MAGIC:
+            raise CorpusFormatException(f"{path} is not a corpus")
+        if format_version != _FORMAT_VERSION:
+            raise CorpusFormatException(
+                f"{path} has format version {format_version}, expected {_FORMAT_VERSION}")
+
+        self.encoding = encoding.rstrip(b"\0").decode("ascii")
+        if self.encoding not in compression.available_encodings():
+            raise CorpusFormatException(
+                f"{path} is compressed with {self.encoding}. Is the library for it installed?")
+        self.formatter_version = formatter_version.rstrip(b"\0").decode("ascii")
+        self._index = json.loads(self._map[index_offset:index_offset + index_length])
+
+    def __len__(self):
+        return len(self._index)
+
+    def __contains__(self, key):
+        return key in self._index
+
+    def get(self, masechet, amud):
+        """Returns the amud as `compression.CompressedBytes`, or None if it isn't in the corpus."""
+        entry = self._index.get(corpus_key(masechet, amud))
+        if entry is None:
+            return None
+        offset, length, content_hash = entry
+        return compression.CompressedBytes(
+            self.encoding, self._map[offset:offset + length], content_hash)
+
+    def close(self):
+        self._map.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default="cached_outputs/api_request_handler")
+    parser.add_argument("--output", default="cached_outputs/corpus.bin")
+    parser.add_argument(
+        "--compression", default="gzip", choices=compression.available_encodings())
+    args = parser.parse_args()
+
+    count = build_corpus(args.input, args.output, args.compression)
+    print(f"Wrote {count} amudim to {args.output} ({os.path.getsize(args.output) / 1e6:.1f}MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+from corpus import Corpus
+from corpus import CorpusFormatException
+from corpus import build_corpus
+from util import compression
+import json
+import os
+import shutil
+import tempfile
+
+temporary_directory = tempfile.mkdtemp()
+input_directory = os.path.join(temporary_directory, "api_request_handler")
+os.mkdir(input_directory)
+
+amudim = {}
+for name in os.listdir("test_data/api_request_handler"):
+    if name.endswith(".expected-output.json"):
+        masechet, amud = name[:-len(".expected-output.json")].split(".")
+        shutil.copy(f"test_data/api_request_handler/{name}",
+                    f"{input_directory}/{masechet}.{amud}.json")
+        with open(f"{input_directory}/{masechet}.{amud}.json", "r") as input_file:
+            amudim[(masechet, amud)] = json.load(input_file)
+# File names use canonical names, which may have spaces
+with open(f"{input_directory}/Avodah Zarah.2a.json", "w") as input_file:
+    json.dump({"id": "2a"}, input_file)
+amudim[("Avodah Zarah", "2a")] = {"id": "2a"}
+
+try:
+    corpus_path = os.path.join(temporary_directory, "corpus.bin")
+    for encoding in compression.available_encodings():
+        assert build_corpus(input_directory, corpus_path, encoding) == len(amudim)
+        corpus = Corpus(corpus_path)
+        assert len(corpus) == len(amudim)
+        assert corpus.encoding == encoding
+        for (masechet, amud), expected in amudim.items():
+            compressed = corpus.get(masechet, amud)
+            assert compressed.encoding == encoding
+            assert json.loads(compressed.decompress()) == expected
+            assert compressed.content_hash == compression.content_hash(compressed.decompress())
+        assert corpus.get("Berakhot", "3a") is None
+        corpus.close()
+
+    with open(corpus_path, "wb") as corpus_file:
+        corpus_file.write(b"not a corpus" * 10)
+    try:
+        Corpus(corpus_path)
+        raise AssertionError("Expected a CorpusFormatException")
+    except CorpusFormatException:
+        pass
+finally:
+    shutil.rmtree(temporary_directory)
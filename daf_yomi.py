@@ -0,0 +1,101 @@
+"""Computes the daf yomi locally, without a request to Sefaria's calendar API."""
+
+from masechtot import MASECHTOT_BY_CANONICAL_NAME
+import datetime
+
+def _masechet_dafim(name):
+    masechet = MASECHTOT_BY_CANONICAL_NAME[name]
+    first_daf = int(masechet.start[:-1])
+    # Tamid begins on 25b, but the daf yomi learns 25 with Kinnim
+    if masechet.start.endswith("b"):
+        first_daf += 1
+    return name, first_daf, int(masechet.end[:-1])
+
+# (name, first daf, last daf) for each masechet, in the order that the daf yomi learns them.
+# Shekalim (from the Yerushalmi), Kinnim, and Middot aren't on talmud.page, but they are part of the
+# cycle.
+_CYCLE = (
+    _masechet_dafim("Berakhot"),
+    _masechet_dafim("Shabbat"),
+    _masechet_dafim("Eruvin"),
+    _masechet_dafim("Pesachim"),
+    ("Shekalim", 2, 22),
+    _masechet_dafim("Yoma"),
+    _masechet_dafim("Sukkah"),
+    _masechet_dafim("Beitzah"),
+    _masechet_dafim("Rosh Hashanah"),
+    _masechet_dafim("Taanit"),
+    _masechet_dafim("Megillah"),
+    _masechet_dafim("Moed Katan"),
+    _masechet_dafim("Chagigah"),
+    _masechet_dafim("Yevamot"),
+    _masechet_dafim("Ketubot"),
+    _masechet_dafim("Nedarim"),
+    _masechet_dafim("Nazir"),
+    _masechet_dafim("Sotah"),
+    _masechet_dafim("Gittin"),
+    _masechet_dafim("Kiddushin"),
+    _masechet_dafim("Bava Kamma"),
+    _masechet_dafim("Bava Metzia"),
+    _masechet_dafim("Bava Batra"),
+    _masechet_dafim("Sanhedrin"),
+    _masechet_dafim("Makkot"),
+    _masechet_dafim("Shevuot"),
+    _masechet_dafim("Avodah Zarah"),
+    _masechet_dafim("Horayot"),
+    _masechet_dafim("Zevachim"),
+    _masechet_dafim("Menachot"),
+    _masechet_dafim("Chullin"),
+    _masechet_dafim("Bekhorot"),
+    _masechet_dafim("Arakhin"),
+    _masechet_dafim("Temurah"),
+    _masechet_dafim("Keritot"),
+    _masechet_dafim("Meilah"),
+    ("Kinnim", 23, 25),
+    _masechet_dafim("Tamid"),
+    ("Middot", 34, 37),
+    _masechet_dafim("Niddah"),
+)
+
+CYCLE_LENGTH = sum(last - first + 1 for _, first, last in _CYCLE)
+
+# The 14th cycle. Since the 8th cycle (1975), every cycle has been CYCLE_LENGTH days long.
+_CYCLE_START = datetime.date(2020, 1, 5)
+
+
+class DafYomi(object):
+    def __init__(self, masechet, daf):
+        self.masechet = masechet
+        self.daf = daf
+
+    def is_on_talmud_page(self):
+        return self.masechet in MASECHTOT_BY_CANONICAL_NAME
+
+    def url_masechet(self):
+        return self.masechet.replace(" ", "_")
+
+    def amudim(self):
+        """The amudim of this daf that exist on talmud.page."""
+        if not self.is_on_talmud_page():
+            return ()
+        masechet = MASECHTOT_BY_CANONICAL_NAME[self.masechet]
+        return tuple(filter(masechet.does_amud_exist, (f"{self.daf}a", f"{self.daf}b")))
+
+    def to_url_pathname(self):
+        return f"/{self.url_masechet()}/{self.daf}"
+
+    def __eq__(self, other):
+        return (self.masechet, self.daf) == (other.masechet, other.daf)
+
+    def __str__(self):
+        return f"{self.masechet} {self.daf}"
+
+
+def daf_yomi(date):
+    """Returns the `DafYomi` that is learned on `date`. Only valid for dates since June 1975."""
+    day_of_cycle = (date - _CYCLE_START).days % CYCLE_LENGTH
+    for masechet, first_daf, last_daf in _CYCLE:
+        daf_count = last_daf - first_daf + 1
+        if day_of_cycle < daf_count:
+            return DafYomi(masechet, first_daf + day_of_cycle)
+        day_of_cycle -= daf_count
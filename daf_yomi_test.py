@@ -0,0 +1,24 @@
+from daf_yomi import CYCLE_LENGTH
+from daf_yomi import DafYomi
+from daf_yomi import daf_yomi
+import datetime
+
+def assert_daf_yomi(date, masechet, daf):
+    actual = daf_yomi(date)
+    if actual != DafYomi(masechet, daf):
+        raise AssertionError(f"Expected {masechet} {daf} on {date}, but was {actual}")
+
+assert CYCLE_LENGTH == 2711
+
+# Siyum HaShas of the 13th cycle and the start of the 14th cycle
+assert_daf_yomi(datetime.date(2020, 1, 4), "Niddah", 73)
+assert_daf_yomi(datetime.date(2020, 1, 5), "Berakhot", 2)
+assert_daf_yomi(datetime.date(2020, 3, 7), "Berakhot", 64)
+assert_daf_yomi(datetime.date(2020, 3, 8), "Shabbat", 2)
+# Start of the 13th cycle
+assert_daf_yomi(datetime.date(2012, 8, 3), "Berakhot", 2)
+
+assert DafYomi("Berakhot", 64).amudim() == ("64a",)
+assert DafYomi("Tamid", 26).amudim() == ("26a", "26b")
+assert DafYomi("Kinnim", 23).amudim() == ()
+assert DafYomi("Bava Kamma", 5).to_url_pathname() == "/Bava_Kamma/5"
@@ -26,8 +26,8 @@ if __name__ == '__main__':
 
     class HadranRequestHandler(AbstractApiRequestHandler):
 
-        async def _make_requests(self):
-            return [await self._request_maker.request_amud("Hadran")]
+        def _make_requests(self):
+            return [self._request_maker.request_amud("Hadran")]
 
         def _make_id(self):
             return "Hadran"
@@ -0,0 +1,94 @@
+from source_formatting.commentary_parentheses import CommentaryParenthesesTransformer
+from source_formatting.commentary_prefixes import CommentaryPrefixStripper
+from source_formatting.hebrew_small_to_emphasis import HebrewSmallToEmphasisTagTranslator
+from source_formatting.html_parser import BaseHtmlTranslator
+from source_formatting.html_parser import HtmlTranslationPipeline
+from source_formatting.image_numbering import ImageNumberingFormatter
+from source_formatting.section_symbol import SectionSymbolRemover
+from source_formatting.sefaria_link_sanitizer import SefariaLinkSanitizer
+
+def assert_same_as_sequential(translators, text, english_name=None):
+    expected = text
+    for translator in translators:
+        expected = translator.process(expected, english_name=english_name)
+    actual = HtmlTranslationPipeline(*translators).process(text, english_name=english_name)
+    if actual != expected:
+        raise AssertionError(f"For {text!r}:\n{actual!r}\n!=\n{expected!r}")
+
+class CopyingTranslator(BaseHtmlTranslator):
+    def handle_starttag(self, tag, attrs):
+        self.append_start_tag(tag, attrs)
+
+    def handle_endtag(self, tag):
+        self.append_end_tag(tag)
+
+    def handle_data(self, data):
+        self.append_data(data)
+
+
+class SelfClosingTagRemover(CopyingTranslator):
+    def handle_startendtag(self, tag, attrs):
+        pass
+
+
+class EntityReferenceKeeper(CopyingTranslator):
+    def __init__(self):
+        super().__init__()
+        self.convert_charrefs = False
+
+    def handle_entityref(self, name):
+        self.append_data(f"&amp;{name};")
+
+
+class UppercaseTranslator(CopyingTranslator):
+    def _process_string(self, text):
+        return super()._process_string(text).upper()
+
+
+HEBREW = (
+    HebrewSmallToEmphasisTagTranslator,
+    CommentaryPrefixStripper,
+    CommentaryParenthesesTransformer,
+    ImageNumberingFormatter,
+)
+ENGLISH = (SefariaLinkSanitizer, SectionSymbolRemover)
+
+for text in (
+        "",
+        "plain text",
+        "גמ' <small>(שם)</small> טקסט",
+        "<b>גמ' </b>מתני' (א) <img src='a.png'> (ב) <img src=\"b.png\"/>",
+        # Character references that decode to markup when the output is parsed again
+        "1 &lt; 2 &amp;amp; (3 &gt; 2)",
+        "<span title=\"a&quot;b\">(x)</span>",
+        # Text that is held back at the end of the input
+        "(a) AT&T",
+        "<br><br/>< b>text</b x><!-- comment --><script>(a)</script>(b)",
+        ["(a)", ["<small>b</small>", "גמ' c"]],
+):
+    assert_same_as_sequential(HEBREW, text)
+    assert_same_as_sequential(HEBREW, text, english_name="Steinsaltz")
+
+for text in (
+        "§ 1. Plain text",
+        "<a href=\"/x\">§ Link</a> (and) <i>it's</i> &nbsp;spaced&nbsp;",
+        "<a href=\"/x\">Rabbi</a> <a href=\"/y\">Yoḥanan</a>",
+        "<span data-x=\"&nbsp;\">§ a</span> &amp; b < c",
+        "AT&T",
+):
+    assert_same_as_sequential(ENGLISH, text)
+
+# Translators that handle events that aren't tokenized, or that process their whole input, whether
+# or not they're the first in the pipeline
+for translators in (
+        (SelfClosingTagRemover, SectionSymbolRemover),
+        (EntityReferenceKeeper, SectionSymbolRemover),
+        (UppercaseTranslator, SectionSymbolRemover),
+        (SectionSymbolRemover, SelfClosingTagRemover, UppercaseTranslator, EntityReferenceKeeper),
+):
+    for text in (
+            "§ a<br/>b<img src=\"x\"/>",
+            "§ a &amp; b &lt;i&gt;",
+            "<b>§ bold</b> text",
+    ):
+        assert_same_as_sequential(translators, text)
@@ -0,0 +1,52 @@
+from source_formatting.jastrow import _ORDERED_ABBREVIATIONS
+from source_formatting.jastrow import _apply_regex
+from source_formatting.jastrow import _deabbreviate_jastrow
+import json
+import os
+import random
+
+def deabbreviate_sequentially(text):
+    """The previous implementation of _deabbreviate_jastrow()."""
+    for abbreviation in _ORDERED_ABBREVIATIONS:
+        text = _apply_regex(text, abbreviation)
+    return text
+
+def assert_same_as_sequential(text):
+    expected = deabbreviate_sequentially(text)
+    actual = _deabbreviate_jastrow(text)
+    if actual != expected:
+        raise AssertionError(f"For {text!r}:\n{actual!r}\n!=\n{expected!r}")
+
+LITERALS = [abbreviation["abbreviation"] for abbreviation in _ORDERED_ABBREVIATIONS]
+
+for literal in LITERALS:
+    for prefix in ("", " ", "—", " (", "x"):
+        for suffix in ("", "x", ")"):
+            assert_same_as_sequential(prefix + literal + suffix)
+
+# Abbreviations that overlap with, or whose expansions contain, other abbreviations
+for text in (
+        "Koh. Ar. Compl.",
+        "Ruth R. Hash. 5",
+        "R. Hash. Ruth R.",
+        "Beitr. a. Berl. Beitr.",
+        "Ab. d’R. N. a. e. a. v. fr.",
+        "KATz M’bot (KAT",
+):
+    assert_same_as_sequential(text)
+
+random.seed(0)
+for _ in range(300):
+    assert_same_as_sequential("".join(
+        random.choice(LITERALS) + random.choice(("", " ", "—", " (", ") ", "x", ", "))
+        for _ in range(random.randint(1, 8))))
+
+TEST_DATA_DIR = "test_data/api_request_handler"
+for name in os.listdir(TEST_DATA_DIR):
+    if name.endswith(".input.json") and "_on_" not in name:
+        with open(f"{TEST_DATA_DIR}/{name}", "r") as input_file:
+            commentary = json.load(input_file).get("commentary", [])
+        for comment in commentary:
+            if comment.get("collectiveTitle", {}).get("en") == "Jastrow":
+                for text in comment["text"]:
+                    assert_same_as_sequential(text)
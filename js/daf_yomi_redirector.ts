@@ -1,18 +1,20 @@
 import $ from "jquery";
 
-$.ajax({
-  url: "https://sefaria.org/api/calendars",
-  type: "GET",
-  success: (results: any): void => {
-    for (const result of results.calendar_items) {
-      if (result.title.en === "Daf Yomi") {
-        const [masechet, daf] = result.displayValue.en.split(" ");
-        window.location.replace(`${window.location.origin}/${masechet}/${daf}`);
-      }
-    }
-  },
-  error: () => {
+// The server computes the daf yomi for the dates around today (in UTC), and the date in the reader's
+// own timezone picks among them. This avoids a request to Sefaria's calendar API.
+$(() => {
+  const dafYomiByDate = JSON.parse(
+    document.getElementById("daf-yomi-data")!.dataset.dafYomiByDate!);
+
+  const padded = (value: number): string => value.toString().padStart(2, "0");
+  const now = new Date();
+  const today = `${now.getFullYear()}-${padded(now.getMonth() + 1)}-${padded(now.getDate())}`;
+
+  const pathname = dafYomiByDate[today];
+  if (pathname) {
+    window.location.replace(`${window.location.origin}${pathname}`);
+  } else {
     document.getElementById("progress-bar")!.hidden = true;
     document.getElementById("errors")!.hidden = false;
-  },
+  }
 });
@@ -88,6 +88,52 @@ const requestAmud = (amud, options) => {
   refreshPageState();
 };
 
+const readJsonLines = (reader, onJson) => {
+  const decoder = new TextDecoder();
+  let buffer = "";
+  const readChunk = () => reader.read().then(({done, value}) => {
+    if (done) return undefined;
+    buffer += decoder.decode(value, {stream: true});
+    const lines = buffer.split("\n");
+    buffer = lines.pop();
+    lines.filter((line) => line.length > 0).forEach((line) => onJson(JSON.parse(line)));
+    return readChunk();
+  });
+  return readChunk();
+};
+
+// Requests all amudim in the range at once. The server streams each amud as soon as it's ready, so
+// the first amudim can be rendered before the last ones have loaded.
+const requestAmudRange = (amudRange, options) => {
+  const metadata = amudMetadata();
+  for (const amud of amudRange) {
+    renderer.setAmud({
+      id: amud,
+      title: `${metadata.masechet} ${amud}`,
+      loading: true,
+    });
+  }
+
+  const remainingAmudim = new Set(amudRange);
+  const start = amudRange[0];
+  const end = amudRange[amudRange.length - 1];
+  fetch(`${window.location.origin}/api/${metadata.masechet}/${start}/to/${end}`)
+    .then((response) => {
+      if (!response.ok) throw new Error(`${response.status} for ${start} to ${end}`);
+      return readJsonLines(response.body.getReader(), (results) => {
+        if (results.error) return;
+        remainingAmudim.delete(results.id);
+        renderer.setAmud(results);
+        refreshPageState();
+        if (options.callback) options.callback();
+        gtag("event", "amud_loaded", {amud: results.id});
+      });
+    })
+    .catch(() => {})
+    // Anything that failed is retried individually
+    .finally(() => remainingAmudim.forEach((amud) => requestAmud(amud, options)));
+};
+
 const setWindowTop = (selector) => {
   $("html, body").animate({scrollTop: $(selector).offset().top}, 0);
 };
@@ -197,8 +243,10 @@ const main = () => {
       }
     },
   };
-  for (const amud of amudRange) {
-    requestAmud(amud, requestOptions);
+  if (amudRange.length > 1) {
+    requestAmudRange(amudRange, requestOptions);
+  } else {
+    requestAmud(amudRange[0], requestOptions);
   }
 
   $("#previous-amud-container").click(addPreviousAmud);
@@ -0,0 +1,53 @@
+from api_request_handler import _COMMENTARIES
+from api_request_handler import _matching_commentary_kind
+import itertools
+import json
+import os
+
+def _has_matching_property(first, second, property_name):
+    return property_name in first and \
+        property_name in second and \
+        first[property_name] == second[property_name]
+
+def matching_commentary_kind_linearly(comment):
+    """The previous implementation of _matching_commentary_kind()."""
+    name = comment["collectiveTitle"]["en"]
+    for kind in _COMMENTARIES:
+        if name == kind["englishName"] or \
+           _has_matching_property(comment, kind, "category") or \
+           _has_matching_property(comment, kind, "type") or \
+           "englishNamePattern" in kind and kind["englishNamePattern"].findall(name):
+            return kind
+
+def assert_same_as_linear(comment):
+    expected = matching_commentary_kind_linearly(comment)
+    actual = _matching_commentary_kind(comment)
+    if actual is not expected:
+        raise AssertionError(f"For {comment}: {actual} is not {expected}")
+
+def comment(name, category=None, comment_type=None):
+    result = {"collectiveTitle": {"en": name}}
+    if category:
+        result["category"] = category
+    if comment_type:
+        result["type"] = comment_type
+    return result
+
+NAMES = ["Unknown", "", "Rosh", "Tosefta", "Maharam\n", "x\nTosefta Berakhot", "Chokhmat Shlomo"]
+for kind in _COMMENTARIES:
+    NAMES.append(kind["englishName"])
+    if "englishNamePattern" in kind:
+        pattern = kind["englishNamePattern"].pattern.strip("^$").replace(".*", "Berakhot")
+        NAMES.extend((pattern, f"x {pattern}", f"{pattern} x"))
+CATEGORIES = [None, "Talmud"] + [kind["category"] for kind in _COMMENTARIES if "category" in kind]
+TYPES = [None, "commentary"] + [kind["type"] for kind in _COMMENTARIES if "type" in kind]
+
+for name, category, comment_type in itertools.product(NAMES, CATEGORIES, TYPES):
+    assert_same_as_linear(comment(name, category, comment_type))
+
+TEST_DATA_DIR = "test_data/api_request_handler"
+for file_name in os.listdir(TEST_DATA_DIR):
+    if file_name.endswith(".input.json"):
+        with open(f"{TEST_DATA_DIR}/{file_name}", "r") as input_file:
+            for sefaria_comment in json.load(input_file).get("commentary", []):
+                assert_same_as_linear(sefaria_comment)
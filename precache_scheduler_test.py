@@ -0,0 +1,41 @@
+from util.precache_scheduler import PrecacheScheduler
+import threading
+import time
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+def test_runs_in_priority_order_and_drops_oldest():
+    release_first_item = threading.Event()
+    ran = []
+    def work(key):
+        if key == "blocking":
+            release_first_item.wait()
+        ran.append(key)
+
+    scheduler = PrecacheScheduler(work, should_skip=lambda key: key == "cached", max_size=3)
+    scheduler.schedule("blocking", 0)
+    _wait_until(lambda: scheduler.stats()["running"] == 1)
+
+    assert not scheduler.schedule("cached", 0)
+    assert scheduler.schedule("dropped", 2)
+    assert scheduler.schedule("backward", 1)
+    assert scheduler.schedule("forward", 0)
+    assert not scheduler.schedule("forward", 1)
+    assert scheduler.schedule("speculative", 2)
+    assert scheduler.schedule("speculative", 0)
+
+    release_first_item.set()
+    _wait_until(lambda: scheduler.stats()["completed"] == 4)
+
+    if ran != ["blocking", "forward", "speculative", "backward"]:
+        raise AssertionError(ran)
+    stats = scheduler.stats()
+    if (stats["dropped"], stats["skipped"], stats["queueDepth"]) != (1, 1, 0):
+        raise AssertionError(stats)
+
+test_runs_in_priority_order_and_drops_oldest()
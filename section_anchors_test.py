@@ -0,0 +1,29 @@
+from api_request_handler import SectionAnchors
+
+def comment(*anchors):
+    return {"anchorRefExpanded": list(anchors)}
+
+anchors = SectionAnchors("Berakhot 2a:", ":")
+
+assert anchors.section_span({}) is None
+assert anchors.section_index({}) is None
+assert anchors.section_index(comment("Berakhot 2b:1")) is None
+assert anchors.section_span(comment("Berakhot 2a:3")) == (2, 2)
+assert anchors.section_index(comment("Berakhot 2a:3")) == 2
+# Comments that span pages are placed by their first anchor on this page
+assert anchors.section_span(
+    comment("Berakhot 2b:1", "Berakhot 2a:5", "Berakhot 2a:4")) == (4, 4)
+assert anchors.section_span(
+    comment("Berakhot 2a:12", "Berakhot 2a:13", "Berakhot 2a:14")) == (11, 13)
+assert anchors.section_index(comment("Berakhot 2a:12", "Berakhot 2a:13")) == 11
+
+second_level_anchors = SectionAnchors("Rashi on Berakhot 34b:", ":")
+assert second_level_anchors.section_span(comment("Rashi on Berakhot 34b:12:1")) == (11, 11)
+
+try:
+    anchors.section_index(comment("Berakhot 2a:x"))
+    raise AssertionError("Expected a ValueError")
+except ValueError:
+    pass
+# Only the first anchor on this page needs to be parseable
+assert anchors.section_span(comment("Berakhot 2a:1", "Berakhot 2a:x")) == (0, 0)
@@ -4,13 +4,20 @@
 from amud_doesnt_exist import AmudDoesntExistException
 from api_request_handler import ApiRequestHandler
 from api_request_handler import ApiException
+from api_request_handler import CachingRequestMaker
+from api_request_handler import FORMATTER_VERSION
 from api_request_handler import RealRequestMaker
+from api_request_handler import comment_formatting_cache
+from api_request_handler import sefaria_response_cache
+from corpus import Corpus
+from corpus import encode_amud
+from daf_yomi import daf_yomi
 from flask import Flask
+from flask import Response
 from flask import has_request_context
 from flask import jsonify
 from flask import redirect
 from flask import render_template
-from flask import render_template_string
 from flask import request
 from flask import send_file
 from flask import url_for
@@ -19,27 +26,56 @@ from masechtot import Masechtot
 from masechtot import UnknownMasechetNameException
 from masechtot import next_amud
 from masechtot import previous_amud
+from util import compression
 from util.json_files import write_json
+from util.precache_scheduler import PrecacheScheduler
+from util.process_pool import ProcessPool
+from util.single_flight import SingleFlight
+from util.sqlite_cache import SqliteCache
+from util.static_assets import StaticAssets
 import cachetools
+import concurrent.futures
+import datetime
 import flask.logging
+import jinja2
+import json
 import logging
 import math
 import os
-import queue
-import random
-import string
-import sys
+import re
+import sqlite3
 import threading
+import time
 import traceback
 import uuid
 
 def print(*args):
     raise AssertionError(f"Use app.logger instead of print(). Called with: {' '.join(args)}")
 
-random_hash = ''.join(random.choice(string.ascii_letters) for i in range(7))
 app = Flask(__name__)
 masechtot = Masechtot()
-api_request_handler = ApiRequestHandler(RealRequestMaker(), print_function=app.logger.info)
+# Persistent caches are stored here. They survive restarts and are shared by all workers on a host.
+# They're disabled unless this is set, since on some hosts (i.e. App Engine standard) the temporary
+# directory is backed by the instance's memory.
+# AMUD_CACHE_DIR is its previous name, from when it only held the processed amudim.
+cache_directory = os.environ.get("CACHE_DIR", os.environ.get("AMUD_CACHE_DIR"))
+
+def _request_maker():
+    if not cache_directory:
+        return RealRequestMaker()
+    return CachingRequestMaker(
+        RealRequestMaker(),
+        sefaria_response_cache(
+            os.path.join(cache_directory, "sefaria_responses.sqlite3"),
+            max_bytes=int(float(os.environ.get("SEFARIA_CACHE_MAX_MB", 512)) * 1e6)),
+        max_age_seconds=int(os.environ.get("SEFARIA_CACHE_MAX_AGE_SECONDS", 24 * 60 * 60)))
+
+def _formatting_pool():
+    processes = int(os.environ.get("FORMATTING_PROCESSES", 0))
+    return ProcessPool(max_workers=processes) if processes > 0 else None
+
+api_request_handler = ApiRequestHandler(
+    _request_maker(), print_function=app.logger.info, formatting_pool=_formatting_pool())
 
 class RequestFormatter(logging.Formatter):
     width = 1
@@ -74,15 +110,19 @@ def strip_www():
 @app.context_processor
 def template_constants():
     return dict(
-        random_hash=random_hash,
+        main_css_url=fingerprinted_url("css", "css/main.css"),
         debug=app.debug,
     )
 
+# Templates compiled by parcel are loaded with a "dist/" prefix. Jinja caches compiled templates,
+# and in debug mode reloads them when their files change.
+app.jinja_loader = jinja2.ChoiceLoader([
+    app.jinja_loader,
+    jinja2.PrefixLoader({"dist": jinja2.FileSystemLoader(os.path.join(app.root_path, "dist"))}),
+])
+
 def render_compiled_template(file_name, **extra_template_variables):
-    with app.open_resource("dist/%s" % file_name, "r") as template_file:
-        return render_template_string(
-            template_file.read(),
-            **extra_template_variables)
+    return render_template(f"dist/{file_name}", **extra_template_variables)
 
 @app.route("/")
 def homepage():
@@ -163,30 +203,76 @@ def amud_range(masechet, start, end):
 
     return render_compiled_template("talmud_page.html", title = f"{masechet} {start} {end}")
 
+# Static files are precompressed once at startup. Those that are requested by a URL that includes
+# their fingerprint can be cached forever.
+static_assets = StaticAssets(reload_on_change=app.debug)
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+def static_asset_response(path, immutable):
+    asset = static_assets.get(path)
+    variant = asset.best_variant(request.accept_encodings)
+    etag = f"{asset.content_hash}-{variant.encoding}" if variant else asset.content_hash
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif variant:
+        response = Response(variant.data, mimetype=asset.mimetype)
+        response.headers["Content-Encoding"] = variant.encoding
+    else:
+        response = Response(asset.data, mimetype=asset.mimetype)
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if immutable else "no-cache"
+    if asset.variants:
+        response.vary.add("Accept-Encoding")
+    return response
+
+def fingerprinted_url(url_directory, path):
+    return f"/{url_directory}/{static_assets.fingerprint(path)}/{os.path.basename(path)}"
+
 # Creates a capturing lambda
 def send_file_fn(name):
     return lambda: send_file(name)
 
 # Creates a capturing lambda
-def send_file_fn_with_ignored_pattern(name):
-    return lambda ignored: send_file(name)
+def static_asset_fn(path, immutable):
+    return lambda: static_asset_response(path, immutable)
 
-def serve_static_files(directory):
+# Creates a capturing lambda
+def fingerprinted_static_asset_fn(path):
+    return lambda fingerprint: static_asset_response(
+        path, immutable = not app.debug and fingerprint == static_assets.fingerprint(path))
+
+def serve_static_files(directory, url_directory=None, transform=None):
+    url_directory = url_directory or directory
     for name in os.listdir(directory):
+        path = f"{directory}/{name}"
+        static_assets.add(path, transform)
         app.add_url_rule(
-            "/%s/<ignored>/%s" % (directory, name),
-            name,
-            send_file_fn_with_ignored_pattern("%s/%s" % (directory, name)))
+            f"/{url_directory}/<fingerprint>/{name}",
+            f"{url_directory}/{name}",
+            fingerprinted_static_asset_fn(path))
+
+serve_static_files("fonts", url_directory="font")
+for name in os.listdir("fonts"):
+    # Unfingerprinted URLs are still served for pages and stylesheets from before fingerprinting
+    app.add_url_rule("/font/%s" % name, name, static_asset_fn("fonts/%s" % name, immutable=False))
+
+def fingerprint_font_urls(css):
+    return re.sub(
+        rb"url\(/?font/([^)]+)\)",
+        lambda match: b"url(%s)" % fingerprinted_url(
+            "font", "fonts/%s" % match.group(1).decode()).encode(),
+        css)
 
-serve_static_files("css")
+serve_static_files("css", transform=fingerprint_font_urls)
 
 for name in os.listdir("dist"):
     if name.endswith(".js") or name.endswith(".css") or (app.debug and name.endswith(".map")):
-        app.add_url_rule("/%s" % name, name, send_file_fn("dist/%s" % name))
-
-
-for name in os.listdir("fonts"):
-    app.add_url_rule("/font/%s" % name, name, send_file_fn("fonts/%s" % name))
+        static_assets.add("dist/%s" % name)
+        # Production builds include a content hash in each file name
+        app.add_url_rule(
+            "/%s" % name, name, static_asset_fn("dist/%s" % name, immutable=not app.debug))
 
 @app.errorhandler(AmudDoesntExistException)
 def amud_doesnt_exist_404(e):
@@ -207,16 +293,17 @@ def page_not_found(e):
                            message="We don't know what happened!",
                            title="Unknown Error")
 
-# This does not factor in cached strings, but that should not make much of a difference
-def json_size_in_memory(json_object):
-    if type(json_object) in (list, tuple):
-        return sys.getsizeof(json_object) + \
-            sum(map(json_size_in_memory, json_object))
-    elif type(json_object) is dict:
-        return sys.getsizeof(json_object) + \
-            sum(map(json_size_in_memory, json_object.keys())) + \
-            sum(map(json_size_in_memory, json_object.values()))
-    return sys.getsizeof(json_object)
+# The payloads are highly repetitive HTML, so compressing them allows many more amudim to fit in the
+# cache. Clients that accept this encoding are sent the compressed bytes as-is.
+amud_cache_encoding = os.environ.get("AMUD_CACHE_COMPRESSION", "gzip")
+if amud_cache_encoding not in compression.available_encodings():
+    raise ValueError(f"AMUD_CACHE_COMPRESSION={amud_cache_encoding} is not one of "
+                     f"{compression.available_encodings()}. Is the library for it installed?")
+
+def encode_amud_json(response):
+    """Serializes and compresses a processed amud once, so that cache hits can be served directly.
+    """
+    return encode_amud(response, amud_cache_encoding)
 
 def next_smallest_power_of_2(ideal_value):
     return 2 ** math.floor(math.log(ideal_value, 2))
@@ -226,26 +313,97 @@ amud_cache = cachetools.LRUCache(
     maxsize = next_smallest_power_of_2(
         # 150MB, which gets translated into something closer to 134mb by next_smallest_power_of_2
         150 * 1e6),
-    getsizeof = json_size_in_memory)
+    getsizeof = len)
 
-amudim_to_cache_queue = queue.Queue()
+# cachetools caches are not thread safe
+amud_cache_lock = threading.Lock()
 
-def cache_amud_response_in_background():
-    while True:
-        masechet, amud = amudim_to_cache_queue.get()
-        get_and_cache_amud_json(masechet, amud, verb="Precaching")
-        amudim_to_cache_queue.task_done()
-        app.logger.info(f"Queue size: {amudim_to_cache_queue.qsize()}")
+# Bump when the format of values stored in disk_amud_cache changes
+_DISK_AMUD_CACHE_FORMAT = 3
+
+def _disk_amud_cache():
+    if not cache_directory:
+        return None
+    cache = SqliteCache(
+        os.path.join(cache_directory, "amudim.sqlite3"),
+        version=f"{FORMATTER_VERSION}.{_DISK_AMUD_CACHE_FORMAT}.{amud_cache_encoding}",
+        max_bytes=int(float(os.environ.get("AMUD_DISK_CACHE_MAX_MB", 512)) * 1e6))
+    cache.purge_other_versions()
+    return cache
+
+# A second tier behind amud_cache
+disk_amud_cache = _disk_amud_cache()
 
-threading.Thread(target=cache_amud_response_in_background, daemon=True).start()
+def _disk_cache_key(masechet, amud):
+    return f"{masechet}/{amud}"
+
+def _read_disk_cache(masechet, amud):
+    if not disk_amud_cache:
+        return None
+    try:
+        value = disk_amud_cache.get(_disk_cache_key(masechet, amud))
+    except sqlite3.Error:
+        app.logger.exception(f"Error reading {masechet} {amud} from the disk cache")
+        return None
+    return compression.CompressedBytes(amud_cache_encoding, bytes(value)) if value else None
+
+def _write_disk_cache(masechet, amud, response):
+    if not disk_amud_cache:
+        return
+    try:
+        disk_amud_cache.put(_disk_cache_key(masechet, amud), response.data)
+    except sqlite3.Error:
+        app.logger.exception(f"Error writing {masechet} {amud} to the disk cache")
+
+def _amud_corpus():
+    path = os.environ.get("CORPUS_FILE")
+    if not path:
+        return None
+    corpus = Corpus(path)
+    if corpus.formatter_version != FORMATTER_VERSION:
+        app.logger.warning(
+            f"{path} was built with formatter version {corpus.formatter_version}, but the current "
+            f"version is {FORMATTER_VERSION}")
+    return corpus
+
+# When CORPUS_FILE is set (see corpus.py), the /api/ routes are served only from that file, and
+# Sefaria is never requested. The file is memory mapped, so every worker process shares its pages.
+amud_corpus = _amud_corpus()
+
+def _read_corpus(masechet, amud):
+    response = amud_corpus.get(masechtot.canonical_masechet_name(masechet), amud)
+    if not response:
+        return {"error": f"{masechet} {amud} is not available"}, 404
+    return response, 200
+
+# Ensures that concurrent requests for the same amud (i.e. a reader and the precaching thread, or
+# many readers of the daf yomi) only make one set of requests to Sefaria.
+amud_requests_in_flight = SingleFlight()
 
 def get_and_cache_amud_json(masechet, amud, verb="Requesting"):
+    if amud_corpus:
+        return _read_corpus(masechet, amud)
+    cache_key = (masechet, amud)
+    with amud_cache_lock:
+        response = amud_cache.get(cache_key)
+        if response:
+            # no matter what, always update the LRU status
+            amud_cache[cache_key] = response
+            return response, 200
+    return amud_requests_in_flight.do(
+        cache_key, lambda: _request_and_cache_amud_json(masechet, amud, verb))
+
+def _request_and_cache_amud_json(masechet, amud, verb):
     cache_key = (masechet, amud)
-    response = amud_cache.get(cache_key)
+    # Another request may have finished in between the cache miss and this request starting
+    with amud_cache_lock:
+        response = amud_cache.get(cache_key)
+    if not response:
+        response = _read_disk_cache(masechet, amud)
     if not response:
         try:
             app.logger.info(f"{verb} {masechet} {amud}")
-            response = api_request_handler.amud_api_request(masechet, amud)
+            response = encode_amud_json(api_request_handler.amud_api_request(masechet, amud))
             app.logger.info(f"{verb} {masechet} {amud} --- Done")
         except ApiException as e:
             return {"error": e.message, "code": e.internal_code}, e.http_status
@@ -254,10 +412,32 @@ def get_and_cache_amud_json(masechet, amud, verb="Requesting"):
             app.logger.error(f"Error with uuid: {_uuid}")
             traceback.print_exc()
             return {"error": "An unknown exception occurred", "id": _uuid}, 500
-    # no matter what, always update the LRU status
-    amud_cache[cache_key] = response
+        _write_disk_cache(masechet, amud, response)
+    with amud_cache_lock:
+        amud_cache[cache_key] = response
     return response, 200
 
+# Precaching priorities. Lower values run first.
+PRIORITY_NEXT_AMUD = 0
+PRIORITY_PREVIOUS_AMUD = 1
+PRIORITY_SPECULATIVE = 2
+
+def _should_skip_precaching(cache_key):
+    # Reading from the corpus is as fast as a cache hit
+    return amud_corpus is not None or _is_cached_or_in_flight(cache_key)
+
+def _is_cached_or_in_flight(cache_key):
+    with amud_cache_lock:
+        if cache_key in amud_cache:
+            return True
+    return amud_requests_in_flight.is_in_flight(cache_key)
+
+precache_scheduler = PrecacheScheduler(
+    work = lambda cache_key: get_and_cache_amud_json(*cache_key, verb="Precaching"),
+    should_skip = _should_skip_precaching,
+    max_size = int(os.environ.get("PRECACHE_QUEUE_SIZE", 128)),
+    worker_count = int(os.environ.get("PRECACHE_WORKERS", 2)))
+
 @app.route("/api/<masechet>/<amud>")
 def amud_json(masechet, amud):
     canonical_masechet = masechtot.canonical_url_masechet_name(masechet)
@@ -270,13 +450,123 @@ def amud_json(masechet, amud):
 
     response, code = get_and_cache_amud_json(masechet, amud)
 
-    for possible_amud in [previous_amud(amud), next_amud(amud)]:
+    for possible_amud, priority in [(next_amud(amud), PRIORITY_NEXT_AMUD),
+                                    (previous_amud(amud), PRIORITY_PREVIOUS_AMUD)]:
         if masechtot.does_amud_exist(masechet, possible_amud):
-            amudim_to_cache_queue.put((masechet, possible_amud))
+            precache_scheduler.schedule((masechet, possible_amud), priority)
         else:
             app.logger.error(f"Ignoring {possible_amud}")
 
-    return jsonify(response), code
+    if code != 200:
+        return jsonify(response), code
+    return compressed_json_response(response)
+
+def _amud_cache_control():
+    directives = [
+        "public",
+        f"max-age={int(os.environ.get('AMUD_MAX_AGE_SECONDS', 60 * 60))}",
+    ]
+    stale_while_revalidate = int(
+        os.environ.get("AMUD_STALE_WHILE_REVALIDATE_SECONDS", 7 * 24 * 60 * 60))
+    if stale_while_revalidate:
+        directives.append(f"stale-while-revalidate={stale_while_revalidate}")
+    return ", ".join(directives)
+
+# Amudim only change when the formatting code changes (i.e. on a deploy), so clients and caches can
+# keep using them for a while, and then revalidate with the ETag.
+amud_cache_control = _amud_cache_control()
+
+def compressed_json_response(compressed):
+    send_compressed = bool(request.accept_encodings[compressed.encoding])
+    # Strong ETags need to differ for each Content-Encoding of the same content
+    etag = compressed.content_hash
+    if send_compressed:
+        etag = f"{etag}-{compressed.encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    elif send_compressed:
+        response = Response(compressed.data, mimetype="application/json")
+        response.headers["Content-Encoding"] = compressed.encoding
+    else:
+        response = Response(compressed.decompress(), mimetype="application/json")
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = amud_cache_control
+    response.vary.add("Accept-Encoding")
+    return response
+
+range_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers = int(os.environ.get("RANGE_REQUEST_CONCURRENCY", 8)),
+    thread_name_prefix = "range")
+# How many of range_executor's threads a single range request can use at once, so that long ranges
+# don't queue ahead of every other reader's requests.
+range_request_concurrency = int(os.environ.get("RANGE_REQUEST_CONCURRENCY_PER_REQUEST", 2))
+range_request_max_amudim = int(os.environ.get("RANGE_REQUEST_MAX_AMUDIM", 40))
+
+@app.route("/api/<masechet>/<start>/to/<end>")
+def amud_range_json(masechet, start, end):
+    """Streams each amud in the range as newline-delimited JSON, in the order that they are ready.
+    """
+    canonical_masechet = masechtot.canonical_url_masechet_name(masechet)
+    if canonical_masechet != masechet:
+        return redirect(url_for(
+            "amud_range_json", masechet = canonical_masechet, start = start, end = end))
+    try:
+        _validate_amudim(masechet, start, end)
+    except AmudDoesntExistException as e:
+        return jsonify({"error": e.message()}), 404
+    if are_amudim_in_reverse_order(start, end):
+        return redirect(url_for("amud_range_json", masechet = masechet, start = end, end = start))
+
+    amudim = [start]
+    while amudim[-1] != end:
+        amudim.append(next_amud(amudim[-1]))
+        if len(amudim) > range_request_max_amudim:
+            return jsonify({
+                "error": f"Ranges can have at most {range_request_max_amudim} amudim",
+            }), 400
+
+    for possible_amud, priority in [(next_amud(end), PRIORITY_NEXT_AMUD),
+                                    (previous_amud(start), PRIORITY_PREVIOUS_AMUD)]:
+        if masechtot.does_amud_exist(masechet, possible_amud):
+            precache_scheduler.schedule((masechet, possible_amud), priority)
+
+    def _lines():
+        unsubmitted_amudim = iter(amudim)
+        futures = {}
+
+        def _submit_next_amud():
+            amud = next(unsubmitted_amudim, None)
+            if amud:
+                futures[range_executor.submit(get_and_cache_amud_json, masechet, amud)] = amud
+
+        for _ in range(range_request_concurrency):
+            _submit_next_amud()
+        while futures:
+            done, _ = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                amud = futures.pop(future)
+                _submit_next_amud()
+                response, code = future.result()
+                if code == 200:
+                    yield response.decompress() + b"\n"
+                else:
+                    yield json.dumps({
+                        "id": amud,
+                        "error": response["error"],
+                        "code": code,
+                    }).encode("utf-8") + b"\n"
+
+    return Response(_lines(), mimetype="application/x-ndjson")
+
+@app.route("/stats")
+def stats():
+    return jsonify({
+        "amudRequests": amud_requests_in_flight.stats(),
+        "commentFormatting": comment_formatting_cache.stats(),
+        "precache": precache_scheduler.stats(),
+    })
 
 @app.route("/preferences")
 def preferences():
@@ -305,10 +595,52 @@ def notes(masechet):
 
     return render_compiled_template("notes_redirecter.html")
 
+def _daf_yomi_dates():
+    # The daf yomi changes at midnight in each reader's timezone, which may be a day behind or ahead
+    # of UTC.
+    today = datetime.datetime.utcnow().date()
+    return [today + datetime.timedelta(days=offset) for offset in (-1, 0, 1)]
+
 @app.route("/yomi")
 @app.route("/daf-yomi")
 def yomi():
-    return render_compiled_template("daf_yomi_redirector.html")
+    daf_yomi_by_date = {str(date): daf_yomi(date).to_url_pathname() for date in _daf_yomi_dates()}
+    return render_compiled_template(
+        "daf_yomi_redirector.html", daf_yomi_by_date = json.dumps(daf_yomi_by_date))
+
+def warm_up_daf_yomi_cache(days_ahead):
+    """Precaches the daf yomi (and its neighboring amudim) from yesterday until `days_ahead`."""
+    today = datetime.datetime.utcnow().date()
+    for offset in list(range(days_ahead + 1)) + [-1]:
+        daf = daf_yomi(today + datetime.timedelta(days=offset))
+        masechet = daf.url_masechet()
+        for amud in daf.amudim():
+            for possible_amud in (amud, next_amud(amud), previous_amud(amud)):
+                if masechtot.does_amud_exist(masechet, possible_amud):
+                    precache_scheduler.schedule((masechet, possible_amud), PRIORITY_SPECULATIVE)
+
+def _warm_up_daf_yomi_cache_daily(days_ahead, utc_hour):
+    while True:
+        try:
+            warm_up_daf_yomi_cache(days_ahead)
+        except Exception:
+            # Try again on the next run, rather than ending the thread
+            app.logger.exception("Error warming up the daf yomi cache")
+        now = datetime.datetime.utcnow()
+        next_run = now.replace(hour=utc_hour, minute=0, second=0, microsecond=0)
+        if next_run <= now:
+            next_run += datetime.timedelta(days=1)
+        time.sleep((next_run - now).total_seconds())
+
+# By default, this runs at startup and then a few hours before midnight in Israel, so that the next
+# daf is cached before the first readers of the day request it.
+if not app.debug and os.environ.get("DAF_YOMI_WARMUP_DAYS") != "":
+    threading.Thread(
+        target=_warm_up_daf_yomi_cache_daily,
+        name="daf-yomi-warmup",
+        args=(int(os.environ.get("DAF_YOMI_WARMUP_DAYS", 2)),
+              int(os.environ.get("DAF_YOMI_WARMUP_UTC_HOUR", 19))),
+        daemon=True).start()
 
 if app.debug:
     @app.route("/google-docs-record", methods=["POST"])
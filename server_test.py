@@ -0,0 +1,72 @@
+import gzip
+import json
+import os
+
+# server.py starts background work and reads its configuration when it's imported
+os.environ["DAF_YOMI_WARMUP_DAYS"] = ""
+os.environ["PRECACHE_WORKERS"] = "0"
+os.environ["AMUD_CACHE_COMPRESSION"] = "gzip"
+for name in ("CACHE_DIR", "AMUD_CACHE_DIR", "CORPUS_FILE"):
+    os.environ.pop(name, None)
+
+# dist/ is parcel's output, which server.py lists on startup
+created_dist_directory = not os.path.isdir("dist")
+if created_dist_directory:
+    os.mkdir("dist")
+try:
+    import server
+finally:
+    if created_dist_directory:
+        os.rmdir("dist")
+
+from api_request_handler import ApiRequestHandler # noqa: E402
+from api_request_handler import CachedResponse # noqa: E402
+
+class FakeRequestMaker(object):
+    async def request_amud(self, ref):
+        with open(f"test_data/api_request_handler/{ref}.input.json", "r") as input_file:
+            return CachedResponse(input_file.read())
+
+
+server.api_request_handler = ApiRequestHandler(
+    FakeRequestMaker(), print_function=lambda *args: None)
+client = server.app.test_client()
+
+with open("test_data/api_request_handler/Berakhot.2a.expected-output.json", "r") as expected_file:
+    expected = json.load(expected_file)
+
+def assert_equal(expected, actual):
+    if expected != actual:
+        raise AssertionError(f"Expected {expected}, got {actual}")
+
+def get(headers):
+    return client.get("/api/Berakhot/2a", headers=headers)
+
+compressed = get({"Accept-Encoding": "gzip"})
+assert_equal(200, compressed.status_code)
+assert_equal("gzip", compressed.headers.get("Content-Encoding"))
+assert_equal(expected, json.loads(gzip.decompress(compressed.data)))
+
+uncompressed = get({})
+assert_equal(200, uncompressed.status_code)
+assert_equal(None, uncompressed.headers.get("Content-Encoding"))
+assert_equal(expected, json.loads(uncompressed.data))
+
+for response in (compressed, uncompressed):
+    assert "Accept-Encoding" in response.headers["Vary"]
+    assert response.headers["Cache-Control"].startswith("public")
+
+compressed_etag = compressed.headers["ETag"]
+uncompressed_etag = uncompressed.headers["ETag"]
+# Strong ETags need to differ for each Content-Encoding of the same content
+assert compressed_etag != uncompressed_etag
+
+not_modified = get({"Accept-Encoding": "gzip", "If-None-Match": compressed_etag})
+assert_equal(304, not_modified.status_code)
+assert_equal(b"", not_modified.data)
+assert_equal(compressed_etag, not_modified.headers["ETag"])
+assert_equal(304, get({"If-None-Match": uncompressed_etag}).status_code)
+
+# An ETag for the other encoding doesn't match
+assert_equal(200, get({"If-None-Match": compressed_etag}).status_code)
+assert_equal(200, get({"Accept-Encoding": "gzip", "If-None-Match": uncompressed_etag}).status_code)
@@ -55,7 +55,7 @@ class HtmlExtractor(BaseHtmlTranslator):
 
     def handle_data(self, data):
         if self.ongoing and self.tag_stack[-1] == "b":
-            self._out.append(data)
+            self.append_data(data)
 
 
 def get_title(section, siman):
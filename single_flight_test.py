@@ -0,0 +1,77 @@
+from util.single_flight import SingleFlight
+import threading
+import time
+
+def _wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Timed out")
+        time.sleep(0.01)
+
+def _start_callers(single_flight, key, fn, count):
+    """Starts `count` threads that call `single_flight.do(key, fn)`, and returns their outcomes."""
+    outcomes = []
+    outcomes_lock = threading.Lock()
+
+    def call():
+        try:
+            outcome = single_flight.do(key, fn)
+        except Exception as e:
+            outcome = e
+        with outcomes_lock:
+            outcomes.append(outcome)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, outcomes
+
+def test_waiting_callers_share_the_leaders_result():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    runs = []
+    def fn():
+        runs.append(1)
+        release.wait()
+        return "result"
+
+    threads, outcomes = _start_callers(single_flight, "key", fn, 4)
+    _wait_until(lambda: single_flight.stats()["coalescedCalls"] == 3)
+    assert single_flight.is_in_flight("key")
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    if outcomes != ["result"] * 4 or len(runs) != 1:
+        raise AssertionError((outcomes, runs))
+    stats = single_flight.stats()
+    if (stats["calls"], stats["coalescedCalls"], stats["inFlight"]) != (1, 3, 0):
+        raise AssertionError(stats)
+
+    # The key is cleared once the call finishes, so a later call runs again
+    assert not single_flight.is_in_flight("key")
+    assert single_flight.do("key", lambda: "another result") == "another result"
+    assert single_flight.stats()["calls"] == 2
+
+def test_exceptions_reach_every_waiting_caller():
+    single_flight = SingleFlight()
+    release = threading.Event()
+    exception = ValueError("failed")
+    def fn():
+        release.wait()
+        raise exception
+
+    threads, outcomes = _start_callers(single_flight, "key", fn, 3)
+    _wait_until(lambda: single_flight.stats()["coalescedCalls"] == 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    if outcomes != [exception] * 3:
+        raise AssertionError(outcomes)
+    assert not single_flight.is_in_flight("key")
+    assert single_flight.do("key", lambda: "recovered") == "recovered"
+
+test_waiting_callers_share_the_leaders_result()
+test_exceptions_reach_every_waiting_caller()
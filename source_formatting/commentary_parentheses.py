@@ -2,6 +2,9 @@
 # -*- coding: utf-8 -*-
 
 from source_formatting.html_parser import BaseHtmlTranslator
+import re
+
+_PARENTHESES = re.compile("([()])")
 
 class CommentaryParenthesesTransformer(BaseHtmlTranslator):
     english_name_ignore = ("Steinsaltz", "Shulchan Arukh", "Mishneh Torah")
@@ -16,5 +19,12 @@ class CommentaryParenthesesTransformer(BaseHtmlTranslator):
         self.append_end_tag(tag)
 
     def handle_data(self, data):
-        self._out.append(
-            data.replace('(', '<span class="parenthesized">(').replace(')', ')</span>'))
+        for piece in _PARENTHESES.split(data):
+            if piece == "(":
+                self.append_start_tag("span", [("class", "parenthesized")])
+                self.append_data(piece)
+            elif piece == ")":
+                self.append_data(piece)
+                self.append_end_tag("span")
+            elif piece:
+                self.append_data(piece)
@@ -26,4 +26,4 @@ class CommentaryPrefixStripper(BaseHtmlTranslator):
                 if data.startswith(prefix):
                     data = data[len(prefix):]
             self.has_processed_text = True
-        self._out.append(data)
+        self.append_data(data)
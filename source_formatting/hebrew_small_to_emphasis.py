@@ -16,4 +16,4 @@ class HebrewSmallToEmphasisTagTranslator(BaseHtmlTranslator):
         self.append_end_tag(tag)
 
     def handle_data(self, data):
-        self._out.append(data)
+        self.append_data(data)
@@ -1,5 +1,7 @@
+import functools
 import html
 import html.parser
+import re
 
 class BaseHtmlTranslator(html.parser.HTMLParser):
     english_name_ignore = None
@@ -7,6 +9,9 @@ class BaseHtmlTranslator(html.parser.HTMLParser):
     def __init__(self):
         super().__init__()
         self._out = []
+        # Set when this translator is a stage of an HtmlTranslationPipeline, in which case the
+        # output is passed directly to the next stage instead of being serialized.
+        self._next_stage = None
 
     @classmethod
     def process(cls, str_or_list, english_name=None):
@@ -17,15 +22,21 @@ class BaseHtmlTranslator(html.parser.HTMLParser):
         return tuple(map(cls.process, str_or_list))
 
     def _process_string(self, text):
-        self.feed(text)
+        self.feed(self.before_feed(text))
         self.before_join()
         return "".join(self._out)
 
+    def before_feed(self, text):
+        return text
+
     def before_join(self):
         pass
 
     def append_start_tag(self, tag, attrs, to=None):
         if to is None:
+            if self._next_stage:
+                self._next_stage.start_tag(tag, attrs)
+                return
             to = self._out
         to.append("<%s" % tag)
         for attr in attrs:
@@ -33,5 +44,311 @@ class BaseHtmlTranslator(html.parser.HTMLParser):
         to.append(">")
 
     def append_end_tag(self, tag, to=None):
+        if to is None and self._next_stage:
+            self._next_stage.end_tag(tag)
+            return
         to = to or self._out
         to.append("</%s>" % tag)
+
+    def append_data(self, data, text=None):
+        """Appends `data`, which is HTML.
+
+        If `data` includes character references, `text` can be set to the text that they represent,
+        which saves the next stage of a pipeline from parsing `data` again.
+        """
+        if self._next_stage:
+            self._next_stage.data(data, text)
+        else:
+            self._out.append(data)
+
+
+class _CannotStream(Exception):
+    pass
+
+
+# Elements whose contents the parser doesn't treat as markup
+_RAW_TEXT_ELEMENTS = frozenset(
+    html.parser.HTMLParser.CDATA_CONTENT_ELEMENTS
+    + getattr(html.parser.HTMLParser, "RCDATA_CONTENT_ELEMENTS", ()))
+
+# Tag and attribute names that are parsed back exactly as they are written by append_start_tag()
+_TAG_NAME = re.compile("[a-z][-.a-z0-9:_]*")
+_ATTRIBUTE_NAME = re.compile("[a-z_:][-.a-z0-9_:]*")
+# Caches of names that have matched _TAG_NAME and _ATTRIBUTE_NAME
+_STREAMABLE_START_TAGS = set()
+_STREAMABLE_END_TAGS = set()
+_STREAMABLE_ATTRIBUTE_NAMES = set()
+
+# Kinds of parser events
+_DATA = "data"
+_START_TAG = "start_tag"
+_END_TAG = "end_tag"
+
+# Tags that can be tokenized with regular expressions, with the same result as HTMLParser
+_SIMPLE_TAG = re.compile(
+    "<(?:"
+    "([a-zA-Z][a-zA-Z0-9]*)((?: +[a-zA-Z_:][-.a-zA-Z0-9_:]*(?:=\"[^\"<>]*\"|='[^'<>]*')?)*) *(/?)>"
+    "|/([a-zA-Z][a-zA-Z0-9]*)>"
+    ")")
+_SIMPLE_ATTRIBUTE = re.compile(" +([^ =]+)(?:=(\"[^\"]*\"|'[^']*'))?")
+
+def _simple_attribute_value(value):
+    if not value:
+        return None
+    value = value[1:-1]
+    if value:
+        return html.unescape(value)
+    return value
+
+def _tokenize_simple_html(text, is_end):
+    """Returns the handler calls that HTMLParser would make when fed `text`, or None if `text`
+    includes anything other than data and simple tags.
+
+    If `is_end` is false, `text` is assumed to be followed by a tag.
+    """
+    events = []
+    position = 0
+    while True:
+        tag_start = text.find("<", position)
+        data_end = len(text) if tag_start < 0 else tag_start
+        if position < data_end:
+            data = text[position:data_end]
+            if "&" in data:
+                # HTMLParser holds back what may be an incomplete character reference at the end
+                if tag_start < 0 and is_end:
+                    return None
+                data = html.unescape(data)
+            events.append((_DATA, data, None))
+        if tag_start < 0:
+            return events
+
+        match = _SIMPLE_TAG.match(text, tag_start)
+        if not match:
+            return None
+        start_tag, attrs, self_closing, end_tag = match.groups()
+        if end_tag:
+            events.append((_END_TAG, end_tag.lower(), None))
+        else:
+            start_tag = start_tag.lower()
+            if start_tag in _RAW_TEXT_ELEMENTS:
+                return None
+            events.append((
+                _START_TAG,
+                start_tag,
+                [(name.lower(), _simple_attribute_value(value))
+                 for name, value in _SIMPLE_ATTRIBUTE.findall(attrs)]))
+            if self_closing:
+                events.append((_END_TAG, start_tag, None))
+        position = match.end()
+
+
+class _EventRecorder(html.parser.HTMLParser):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def handle_starttag(self, tag, attrs):
+        self.events.append((_START_TAG, tag, attrs))
+
+    def handle_endtag(self, tag):
+        self.events.append((_END_TAG, tag, None))
+
+    def handle_data(self, data):
+        self.events.append((_DATA, data, None))
+
+
+class _StageInput(object):
+    """Receives the output of one stage of a pipeline, and calls the next stage's handlers as if it
+    were parsing that output.
+
+    Parsing joins adjacent data and decodes character references, so data is buffered until the next
+    tag. Only data that includes markup is actually parsed. If the output may not be parsed back
+    into the same events, i.e. because of markup that is split across data and tags, `_CannotStream`
+    is raised.
+    """
+
+    def __init__(self, stage):
+        self._stage = stage
+        self._data = []
+        self._text = []
+        self._needs_parsing = False
+        self._has_character_references = False
+
+    def start_tag(self, tag, attrs):
+        if self._data:
+            self._flush_data(is_end=False)
+        if tag not in _STREAMABLE_START_TAGS:
+            if not _TAG_NAME.fullmatch(tag) or tag in _RAW_TEXT_ELEMENTS:
+                raise _CannotStream()
+            _STREAMABLE_START_TAGS.add(tag)
+        self._stage.handle_starttag(tag, _reparsed_attributes(attrs))
+
+    def end_tag(self, tag):
+        if self._data:
+            self._flush_data(is_end=False)
+        if tag not in _STREAMABLE_END_TAGS:
+            if not _TAG_NAME.fullmatch(tag):
+                raise _CannotStream()
+            _STREAMABLE_END_TAGS.add(tag)
+        self._stage.handle_endtag(tag)
+
+    def data(self, data, text):
+        self._data.append(data)
+        if text is None:
+            text = data
+            if "<" in data or "&" in data:
+                self._needs_parsing = True
+        elif "&" in data:
+            self._has_character_references = True
+        self._text.append(text)
+
+    def finish(self):
+        if self._data:
+            self._flush_data(is_end=True)
+
+    def _flush_data(self, is_end):
+        # At the end of the input, the parser holds back text that may be an incomplete character
+        # reference.
+        if self._needs_parsing or (is_end and self._has_character_references):
+            self._parse("".join(self._data), is_end)
+        else:
+            text = self._text[0] if len(self._text) == 1 else "".join(self._text)
+            if text:
+                self._stage.handle_data(text)
+        self._data = []
+        self._text = []
+        self._needs_parsing = False
+        self._has_character_references = False
+
+    def _parse(self, data, is_end):
+        events = _tokenize_simple_html(data, is_end)
+        if events is None:
+            recorder = _EventRecorder()
+            recorder.feed(data)
+            # Anything left over would be parsed together with the tags that follow it. At the end
+            # of the input, it's dropped.
+            if not is_end and (recorder.rawdata or recorder.cdata_elem):
+                raise _CannotStream()
+            events = recorder.events
+        _dispatch(events, self._stage)
+
+
+def _dispatch(events, translator):
+    handle_data = translator.handle_data
+    handle_starttag = translator.handle_starttag
+    handle_endtag = translator.handle_endtag
+    for kind, value, attrs in events:
+        if kind is _DATA:
+            handle_data(value)
+        elif kind is _START_TAG:
+            handle_starttag(value, attrs)
+        else:
+            handle_endtag(value)
+
+
+def _reparsed_attributes(attrs):
+    for name, value in attrs:
+        if (name not in _STREAMABLE_ATTRIBUTE_NAMES
+                or value is None or '"' in value or "&" in value):
+            return list(map(_reparsed_attribute, attrs))
+    return attrs
+
+def _reparsed_attribute(attribute):
+    name, value = attribute
+    value = str(value)
+    if not _ATTRIBUTE_NAME.fullmatch(name) or '"' in value:
+        raise _CannotStream()
+    _STREAMABLE_ATTRIBUTE_NAMES.add(name)
+    if "&" in value:
+        value = html.unescape(value)
+    return name, value
+
+
+def _overrides(translator, method_name):
+    return getattr(translator, method_name) is not getattr(BaseHtmlTranslator, method_name)
+
+# Translators that handle these parser events need their input to be fed to the parser, since
+# _tokenize_simple_html() and _EventRecorder only make the other handler calls.
+_UNTOKENIZABLE_INPUT_METHODS = (
+    "handle_startendtag", "handle_comment", "handle_decl", "handle_pi", "unknown_decl",
+    "handle_charref", "handle_entityref")
+# Translators that also process their input or output as a whole need their input to be actually
+# parsed.
+_UNSTREAMABLE_INPUT_METHODS = _UNTOKENIZABLE_INPUT_METHODS + ("_process_string", "before_feed")
+_UNSTREAMABLE_OUTPUT_METHODS = ("_process_string", "before_join")
+
+@functools.lru_cache(maxsize=None)
+def _can_tokenize_input(translator):
+    return not any(_overrides(translator, method) for method in _UNTOKENIZABLE_INPUT_METHODS)
+
+@functools.lru_cache(maxsize=None)
+def _segments(translators):
+    """Groups `translators` into runs that can pass events directly from one to the next."""
+    segments = [[translators[0]]]
+    for previous, translator in zip(translators, translators[1:]):
+        if (any(_overrides(previous, method) for method in _UNSTREAMABLE_OUTPUT_METHODS)
+                or any(_overrides(translator, method) for method in _UNSTREAMABLE_INPUT_METHODS)):
+            segments.append([translator])
+        else:
+            segments[-1].append(translator)
+    return tuple(map(tuple, segments))
+
+
+class HtmlTranslationPipeline(object):
+    """Applies a sequence of `BaseHtmlTranslator`s, with the same result as calling each of their
+    `process()` methods in turn.
+
+    The text is only parsed once: the tags and data that each translator outputs are passed directly
+    to the next one. Whenever that wouldn't give exactly the same result, the translators are run
+    one at a time instead.
+    """
+
+    def __init__(self, *translators):
+        self._translators = translators
+
+    def process(self, str_or_list, english_name=None):
+        translators = tuple(
+            translator for translator in self._translators
+            if not (translator.english_name_ignore
+                    and english_name in translator.english_name_ignore))
+        if not translators:
+            return str_or_list
+        return self._process(str_or_list, translators)
+
+    def _process(self, str_or_list, translators):
+        if type(str_or_list) != str:
+            return tuple(self._process(item, translators) for item in str_or_list)
+
+        text = str_or_list
+        for segment in _segments(translators):
+            try:
+                text = _process_segment(text, segment)
+            except _CannotStream:
+                for translator in segment:
+                    text = translator()._process_string(text)
+        return text
+
+
+def _process_segment(text, translators):
+    stages = [translator() for translator in translators]
+    stage_inputs = []
+    for stage, next_stage in zip(stages, stages[1:]):
+        stage._next_stage = _StageInput(next_stage)
+        stage_inputs.append(stage._next_stage)
+
+    if _overrides(translators[0], "_process_string"):
+        # _process_string() also ends a segment, so this is the only stage
+        return stages[0]._process_string(text)
+
+    text = stages[0].before_feed(text)
+    events = None
+    if _can_tokenize_input(translators[0]):
+        events = _tokenize_simple_html(text, is_end=True)
+    if events is None:
+        stages[0].feed(text)
+    else:
+        _dispatch(events, stages[0])
+    for stage_input in stage_inputs:
+        stage_input.finish()
+    stages[-1].before_join()
+    return "".join(stages[-1]._out)
@@ -23,7 +23,7 @@ class ImageNumberingFormatter(BaseHtmlTranslator):
         self.append_end_tag(tag)
 
     def handle_data(self, data):
-        self._out.append(data)
+        self.append_data(data)
 
     def format_image_ref(self, counter):
         if counter == 1 and len(self.image_tags) == 1:
@@ -1,4 +1,6 @@
 from source_formatting.html_parser import BaseHtmlTranslator
+import collections
+import heapq
 import re
 
 _ABBREVIATIONS = [
@@ -1168,9 +1170,55 @@ for abbreviation in _ABBREVIATIONS:
     if "exceptions" in abbreviation and "low priority" in abbreviation["exceptions"]:
         _ORDERED_ABBREVIATIONS.append(abbreviation)
 
+# Where an abbreviation's regex can start to match, and the word (i.e. up to the first "." or " ")
+# that the abbreviation would begin with.
+_POSSIBLE_ABBREVIATION = re.compile("(?:^|(?<=[ —]))\\(?([^ .—]*)")
+
+def _first_word(abbreviation):
+    return _POSSIBLE_ABBREVIATION.match(abbreviation).group(1)
+
+# The indices in _ORDERED_ABBREVIATIONS of the abbreviations that begin with each word
+_ABBREVIATIONS_BY_FIRST_WORD = collections.defaultdict(list)
+# Abbreviations that are a single word without a ".", and may therefore be the beginning of a longer
+# word in the text
+_PREFIX_ABBREVIATIONS = []
+
+for index, abbreviation in enumerate(_ORDERED_ABBREVIATIONS):
+    literal = abbreviation["abbreviation"]
+    if _first_word(literal) == literal:
+        _PREFIX_ABBREVIATIONS.append((index, literal))
+    else:
+        _ABBREVIATIONS_BY_FIRST_WORD[_first_word(literal)].append((index, literal))
+
+def _find_abbreviations(text):
+    """Returns the indices of the abbreviations whose regexes may match `text`."""
+    found = set()
+    for match in _POSSIBLE_ABBREVIATION.finditer(text):
+        start = match.start(1)
+        for index, literal in _ABBREVIATIONS_BY_FIRST_WORD.get(match.group(1), ()):
+            if text.startswith(literal, start):
+                found.add(index)
+        for index, literal in _PREFIX_ABBREVIATIONS:
+            if text.startswith(literal, start):
+                found.add(index)
+    return found
+
 def _deabbreviate_jastrow(text):
-    for abbreviation in _ORDERED_ABBREVIATIONS:
-        text = _apply_regex(text, abbreviation)
+    # Equivalent to applying every abbreviation in _ORDERED_ABBREVIATIONS in order, but only the
+    # ones that are found in the text are applied. Since an expansion can create or break up a later
+    # abbreviation, the text is scanned again whenever it changes.
+    pending = sorted(_find_abbreviations(text))
+    queued = set(pending)
+    while pending:
+        index = heapq.heappop(pending)
+        expanded = _apply_regex(text, _ORDERED_ABBREVIATIONS[index])
+        if expanded == text:
+            continue
+        text = expanded
+        for later_index in _find_abbreviations(text):
+            if later_index > index and later_index not in queued:
+                queued.add(later_index)
+                heapq.heappush(pending, later_index)
     return text
 
 def _apply_regex(text, abbreviation):
@@ -1194,7 +1242,7 @@ _ADDITIONAL_TRANSLATION = re.compile("—\\d*\\)")
 class JastrowReformatter(BaseHtmlTranslator):
     def handle_starttag(self, tag, attrs):
         if tag == "b":
-            self._out.append("<br>")
+            self.append_start_tag("br", [])
         self.append_start_tag(tag, attrs)
 
     def handle_endtag(self, tag):
@@ -1202,6 +1250,6 @@ class JastrowReformatter(BaseHtmlTranslator):
 
     def handle_data(self, data):
         if _ADDITIONAL_TRANSLATION.match(data):
-            self._out.append("<br>")
+            self.append_start_tag("br", [])
             data = data.replace("—", "")
-        self._out.append(_deabbreviate_jastrow(data))
+        self.append_data(_deabbreviate_jastrow(data))
@@ -18,4 +18,4 @@ class SectionSymbolRemover(BaseHtmlTranslator):
         if self._is_at_start:
             self._is_at_start = False
             data = data.replace("§ ", "")
-        self._out.append(data)
+        self.append_data(data)
@@ -1,23 +1,32 @@
 from source_formatting.html_parser import BaseHtmlTranslator
 import html
 
+_NBSP_PLACEHOLDER = "__nbsp__"
+
 class SefariaLinkSanitizer(BaseHtmlTranslator):
-    def _process_string(self, text):
-        text = text.replace("&nbsp;", "__nbsp__")
-        text = super()._process_string(text)
-        return text.replace("__nbsp__", "&nbsp;")
+    def before_feed(self, text):
+        return text.replace("&nbsp;", _NBSP_PLACEHOLDER)
 
     def handle_starttag(self, tag, attrs):
         if tag == "a":
             return
-        self.append_start_tag(tag, attrs)
+        self.append_start_tag(
+            _restore_nbsp(tag),
+            [(_restore_nbsp(name), _restore_nbsp(value)) for name, value in attrs])
 
     def handle_endtag(self, tag):
         if tag == "a":
             return
-        self.append_end_tag(tag)
+        self.append_end_tag(_restore_nbsp(tag))
 
     def handle_data(self, data):
         # TODO: perhaps keeping these html encodings is fine.
         # Jastrow on Sefaria doesn't use them for whatever reason.
-        self._out.append(html.escape(data).replace("&apos;", "׳").replace("&quot;", '"'))
+        escaped = html.escape(data).replace("&apos;", "׳").replace("&quot;", '"')
+        self.append_data(
+            _restore_nbsp(escaped), text=data.replace(_NBSP_PLACEHOLDER, "\N{NO-BREAK SPACE}"))
+
+def _restore_nbsp(text):
+    if text is None:
+        return text
+    return text.replace(_NBSP_PLACEHOLDER, "&nbsp;")
@@ -38,4 +38,4 @@ class ShulchanArukhHeaderRemover(BaseHtmlTranslator):
     def handle_data(self, data):
         if self.processing_header:
             return
-        self._out.append(data)
+        self.append_data(data)
@@ -0,0 +1,51 @@
+from util.sqlite_cache import SqliteCache
+import os
+import shutil
+import tempfile
+import time
+
+def test_evicts_least_recently_used_entries():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = SqliteCache(
+            os.path.join(directory, "cache.sqlite3"),
+            version="1",
+            max_bytes=30,
+            access_time_resolution_seconds=0)
+        for key in ("a", "b", "c"):
+            cache.put(key, b"x" * 10)
+            # accessed_at needs to differ between entries
+            time.sleep(0.01)
+        cache.get("a")
+        time.sleep(0.01)
+        cache.put("d", b"x" * 10)
+
+        present = [key for key in ("a", "b", "c", "d") if cache.get(key)]
+        if present != ["a", "c", "d"]:
+            raise AssertionError(present)
+
+        # Other versions are never read
+        if SqliteCache(os.path.join(directory, "cache.sqlite3"), version="2").get("a"):
+            raise AssertionError("Read an entry from another version")
+    finally:
+        shutil.rmtree(directory)
+
+def test_reads_only_update_stale_access_times():
+    directory = tempfile.mkdtemp()
+    try:
+        cache = SqliteCache(os.path.join(directory, "cache.sqlite3"), version="1", max_bytes=30)
+        for key in ("a", "b", "c"):
+            cache.put(key, b"x" * 10)
+            time.sleep(0.01)
+        # "a" was written less than access_time_resolution_seconds ago, so this isn't recorded
+        cache.get("a")
+        cache.put("d", b"x" * 10)
+
+        present = [key for key in ("a", "b", "c", "d") if cache.get(key)]
+        if present != ["b", "c", "d"]:
+            raise AssertionError(present)
+    finally:
+        shutil.rmtree(directory)
+
+test_evicts_least_recently_used_entries()
+test_reads_only_update_stale_access_times()
@@ -0,0 +1,51 @@
+import asyncio
+import os
+import threading
+
+class BackgroundEventLoop(object):
+    """An asyncio event loop that runs forever on a dedicated daemon thread.
+
+    Objects that are bound to a single event loop (like an httpx client and its connection pool)
+    can be shared by every thread in the process, so long as they are only used by coroutines that
+    run on this loop.
+    """
+
+    def __init__(self, name="background-event-loop"):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def is_current(self):
+        return threading.current_thread() is self._thread
+
+    def submit(self, coroutine):
+        """Schedules `coroutine` on this loop and returns a `concurrent.futures.Future`."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    async def run_async(self, coroutine):
+        """Awaits `coroutine` on this loop, regardless of which loop the caller is running on."""
+        if self.is_current():
+            return await coroutine
+        return await asyncio.wrap_future(self.submit(coroutine))
+
+
+_shared_loop = None
+_shared_loop_pid = None
+_shared_loop_lock = threading.Lock()
+
+def shared_event_loop():
+    """Returns the process-wide `BackgroundEventLoop`, starting it on first use.
+
+    Forked processes (i.e. gunicorn workers) don't inherit the parent's loop thread, so each
+    process gets its own loop.
+    """
+    global _shared_loop, _shared_loop_pid
+    with _shared_loop_lock:
+        if _shared_loop is None or _shared_loop_pid != os.getpid():
+            _shared_loop = BackgroundEventLoop()
+            _shared_loop_pid = os.getpid()
+        return _shared_loop
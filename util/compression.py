@@ -0,0 +1,66 @@
+import gzip
+import hashlib
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+def _compressors():
+    # Names are Content-Encoding values
+    compressors = {
+        "gzip": (gzip.compress, gzip.decompress),
+    }
+    if brotli:
+        compressors["br"] = (brotli.compress, brotli.decompress)
+    if zstandard:
+        compressors["zstd"] = (
+            lambda data: zstandard.ZstdCompressor().compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data))
+    return compressors
+
+_COMPRESSORS = _compressors()
+
+def available_encodings():
+    return tuple(_COMPRESSORS.keys())
+
+
+class CompressedBytes(object):
+    """Bytes compressed with the HTTP Content-Encoding `encoding`.
+
+    `content_hash` identifies the uncompressed bytes. gzip embeds a timestamp, so the compressed
+    bytes for the same content can differ between calls to `compress()`.
+    """
+
+    __slots__ = ("encoding", "data", "_content_hash")
+
+    def __init__(self, encoding, data, content_hash=None):
+        self.encoding = encoding
+        self.data = data
+        self._content_hash = content_hash
+
+    def __len__(self):
+        return len(self.data)
+
+    def decompress(self):
+        return _COMPRESSORS[self.encoding][1](self.data)
+
+    @property
+    def content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = content_hash(self.decompress())
+        return self._content_hash
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()[:32]
+
+def compress(data, encoding):
+    if encoding not in _COMPRESSORS:
+        raise ValueError(f"Unsupported encoding: {encoding}. Options: {available_encodings()}")
+    return CompressedBytes(encoding, _COMPRESSORS[encoding][0](data), content_hash(data))
@@ -0,0 +1,49 @@
+import cachetools
+import threading
+
+class LruMemo(object):
+    """A bounded, thread safe LRU cache of the results of a function, with hit-rate counters.
+
+    As with cachetools.LRUCache, `maxsize` is in the units of `getsizeof`, which defaults to
+    counting entries. Values that are larger than `maxsize` are not cached.
+
+    Values are computed outside of the lock, so concurrent misses for the same key may each compute
+    it. The results must therefore be safe to share, i.e. immutable.
+    """
+
+    def __init__(self, maxsize, getsizeof=None):
+        self._cache = cachetools.LRUCache(maxsize=maxsize, getsizeof=getsizeof)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._cache:
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+
+        value = compute()
+        if self._cache.getsizeof(value) <= self._cache.maxsize:
+            with self._lock:
+                self._cache[key] = value
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._cache),
+                "size": self._cache.currsize,
+                "maxSize": self._cache.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hitRate": self.hits / lookups if lookups else 0,
+            }
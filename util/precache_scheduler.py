@@ -0,0 +1,138 @@
+import collections
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+class _Entry(object):
+    __slots__ = ("priority", "sequence", "key", "enqueued_at", "cancelled")
+
+    def __init__(self, priority, sequence, key):
+        self.priority = priority
+        self.sequence = sequence
+        self.key = key
+        self.enqueued_at = time.monotonic()
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+
+class PrecacheScheduler(object):
+    """Runs `work(key)` for scheduled keys on a pool of background worker threads.
+
+    Lower `priority` values run first, and keys of equal priority run in the order that they were
+    scheduled. A key is only queued once; rescheduling a queued key can only raise its priority.
+    Keys for which `should_skip(key)` is true (i.e. they're already cached, or already being
+    fetched) are skipped, both when they are scheduled and again right before they would run. When
+    the queue is full, the oldest queued key is dropped to make room.
+    """
+
+    def __init__(self, work, should_skip, max_size=128, worker_count=1, name="precache"):
+        self._work = work
+        self._should_skip = should_skip
+        self._max_size = max_size
+        self._condition = threading.Condition()
+        self._heap = []
+        # Insertion ordered, so the first entry is the oldest
+        self._queued = collections.OrderedDict()
+        self._sequence = itertools.count()
+        self._logger = logging.getLogger(name)
+
+        self._scheduled = 0
+        self._skipped = 0
+        self._dropped = 0
+        self._completed = 0
+        self._failed = 0
+        self._running = 0
+        self._dequeued = 0
+        self._total_wait_seconds = 0
+        self._max_wait_seconds = 0
+
+        for i in range(worker_count):
+            threading.Thread(target=self._run_worker, name=f"{name}-{i}", daemon=True).start()
+
+    def schedule(self, key, priority):
+        """Returns True if `key` was added to the queue, or had its priority raised."""
+        if self._should_skip(key):
+            with self._condition:
+                self._skipped += 1
+            return False
+
+        with self._condition:
+            existing = self._queued.get(key)
+            if existing:
+                if existing.priority <= priority:
+                    return False
+                existing.cancelled = True
+            elif len(self._queued) >= self._max_size:
+                _, oldest = self._queued.popitem(last=False)
+                oldest.cancelled = True
+                self._dropped += 1
+
+            entry = _Entry(priority, next(self._sequence), key)
+            self._queued[key] = entry
+            heapq.heappush(self._heap, entry)
+            self._scheduled += 1
+            self._compact_heap_if_necessary()
+            self._condition.notify()
+            return True
+
+    def _compact_heap_if_necessary(self):
+        if len(self._heap) > 2 * len(self._queued) + 16:
+            self._heap = [entry for entry in self._heap if not entry.cancelled]
+            heapq.heapify(self._heap)
+
+    def _next_entry(self):
+        with self._condition:
+            while True:
+                while self._heap:
+                    entry = heapq.heappop(self._heap)
+                    if entry.cancelled:
+                        continue
+                    del self._queued[entry.key]
+                    wait_seconds = time.monotonic() - entry.enqueued_at
+                    self._dequeued += 1
+                    self._total_wait_seconds += wait_seconds
+                    self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+                    return entry
+                self._condition.wait()
+
+    def _run_worker(self):
+        while True:
+            entry = self._next_entry()
+            if self._should_skip(entry.key):
+                with self._condition:
+                    self._skipped += 1
+                continue
+
+            with self._condition:
+                self._running += 1
+            try:
+                self._work(entry.key)
+                succeeded = True
+            except Exception:
+                self._logger.exception(f"Error running {entry.key}")
+                succeeded = False
+            with self._condition:
+                self._running -= 1
+                if succeeded:
+                    self._completed += 1
+                else:
+                    self._failed += 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                "queueDepth": len(self._queued),
+                "running": self._running,
+                "scheduled": self._scheduled,
+                "skipped": self._skipped,
+                "dropped": self._dropped,
+                "completed": self._completed,
+                "failed": self._failed,
+                "averageWaitSeconds": (
+                    self._total_wait_seconds / self._dequeued if self._dequeued else 0),
+                "maxWaitSeconds": self._max_wait_seconds,
+            }
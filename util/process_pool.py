@@ -0,0 +1,34 @@
+import concurrent.futures
+import multiprocessing
+import os
+import threading
+
+class ProcessPool(object):
+    """A `ProcessPoolExecutor` that is started on first use in each process.
+
+    Forked processes (i.e. gunicorn workers) can't use their parent's pool, so each process gets its
+    own. Workers are started from a fork server where it's available, since the processes that
+    submit work already have other threads running (like the shared event loop), which isn't safe to
+    fork.
+    """
+
+    def __init__(self, max_workers):
+        self.max_workers = max_workers
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                start_methods = multiprocessing.get_all_start_methods()
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context(
+                        "forkserver" if "forkserver" in start_methods else None))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def submit(self, fn, *args):
+        """Runs `fn(*args)` in a worker process and returns a `concurrent.futures.Future`."""
+        return self._get_executor().submit(fn, *args)
@@ -0,0 +1,61 @@
+import threading
+
+class _Call(object):
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception = None
+
+
+class SingleFlight(object):
+    """Coalesces concurrent calls for the same key so that only one of them does the work.
+
+    Callers that arrive while a call for their key is in flight wait for that call to finish and
+    share its result (or its exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight = {}
+        self.calls = 0
+        self.coalesced_calls = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._in_flight.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _Call()
+                self._in_flight[key] = call
+                self.calls += 1
+            else:
+                self.coalesced_calls += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.exception:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.exception = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def is_in_flight(self, key):
+        with self._lock:
+            return key in self._in_flight
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalescedCalls": self.coalesced_calls,
+                "inFlight": len(self._in_flight),
+            }
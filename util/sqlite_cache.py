@@ -0,0 +1,111 @@
+import os
+import sqlite3
+import threading
+import time
+
+class SqliteCache(object):
+    """A persistent key/value cache stored in a SQLite database.
+
+    The database can be shared by multiple processes on the same host (i.e. all gunicorn workers),
+    and it survives restarts. Each entry is tagged with a `version` so that entries written by
+    different versions of the code that produced them are never read.
+
+    Each entry has a single value by default. Caches created with other `columns` store a row of
+    values per entry, which are read and written with `get_row()` and `put_row()`.
+
+    If `max_bytes` is set, the least recently used entries are deleted when the values in the cache
+    grow beyond it. To keep reads from taking the database's write lock, an entry's access time is
+    only updated if it's older than `access_time_resolution_seconds`. The size of the cache is
+    checked after every 1/16th of `max_bytes` that's written by this process, so the cache can
+    briefly exceed `max_bytes` by that much for each process that writes to it.
+    """
+
+    def __init__(self, path, version, max_bytes=None, columns=("value",),
+                 access_time_resolution_seconds=60):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._path = path
+        self._version = version
+        self._max_bytes = max_bytes
+        self._columns = tuple(columns)
+        self._access_time_resolution_seconds = access_time_resolution_seconds
+        self._bytes_written_since_eviction = 0
+        # sqlite3 connections can't be shared across threads
+        self._thread_local = threading.local()
+        with self._connection() as connection:
+            existing_columns = tuple(
+                row[1] for row in connection.execute("PRAGMA table_info(entries)"))
+            if existing_columns != ("key", "version") + self._columns + ("size", "accessed_at"):
+                connection.execute("DROP TABLE IF EXISTS entries")
+            value_columns = "".join(f"{column} BLOB, " for column in self._columns)
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                f"key TEXT PRIMARY KEY, version TEXT NOT NULL, {value_columns}"
+                "size INTEGER NOT NULL, accessed_at REAL NOT NULL)")
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_by_accessed_at ON entries (accessed_at)")
+
+    def _connection(self):
+        connection = getattr(self._thread_local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self._path, timeout=10)
+            # Allows readers in other processes to read while another process is writing
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._thread_local.connection = connection
+        return connection
+
+    def get(self, key):
+        row = self.get_row(key)
+        return row[0] if row else None
+
+    def put(self, key, value):
+        self.put_row(key, value)
+
+    def get_row(self, key):
+        """Returns a tuple of `key`'s values, in the order of `columns`, or None."""
+        with self._connection() as connection:
+            row = connection.execute(
+                f"SELECT accessed_at, {', '.join(self._columns)} FROM entries "
+                "WHERE key = ? AND version = ?",
+                (key, self._version)).fetchone()
+            if not row:
+                return None
+            now = time.time()
+            if (self._max_bytes is not None
+                    and now - row[0] >= self._access_time_resolution_seconds):
+                connection.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[1:]
+
+    def put_row(self, key, *values):
+        size = sum(len(value) for value in values if isinstance(value, (bytes, str)))
+        with self._connection() as connection:
+            connection.execute(
+                f"INSERT OR REPLACE INTO entries "
+                f"(key, version, {', '.join(self._columns)}, size, accessed_at) "
+                f"VALUES (?, ?, {', '.join('?' * len(values))}, ?, ?)",
+                (key, self._version, *values, size, time.time()))
+            if self._max_bytes is not None:
+                self._bytes_written_since_eviction += size
+                if self._bytes_written_since_eviction >= self._max_bytes / 16:
+                    self._bytes_written_since_eviction = 0
+                    self._evict_least_recently_used(connection)
+
+    def _evict_least_recently_used(self, connection):
+        excess = connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0] - self._max_bytes
+        if excess <= 0:
+            return
+        evicted = []
+        for key, size in connection.execute(
+                "SELECT key, size FROM entries ORDER BY accessed_at"):
+            evicted.append((key,))
+            excess -= size
+            if excess <= 0:
+                break
+        connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+
+    def purge_other_versions(self):
+        with self._connection() as connection:
+            connection.execute("DELETE FROM entries WHERE version != ?", (self._version,))
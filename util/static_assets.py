@@ -0,0 +1,72 @@
+from util import compression
+import mimetypes
+import os
+import threading
+
+# Encodings that browsers support, in order of preference
+_PRECOMPRESSED_ENCODINGS = tuple(
+    encoding for encoding in ("br", "gzip") if encoding in compression.available_encodings())
+
+# Compressed variants that don't save at least this much aren't worth storing
+_MIN_COMPRESSION_RATIO = 0.9
+
+class StaticAsset(object):
+    def __init__(self, path, data, mtime):
+        self.path = path
+        self.mtime = mtime
+        self.mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.data = data
+        self.variants = {}
+        for encoding in _PRECOMPRESSED_ENCODINGS:
+            compressed = compression.compress(data, encoding)
+            if len(compressed) < len(data) * _MIN_COMPRESSION_RATIO:
+                self.variants[encoding] = compressed
+        self.content_hash = compression.content_hash(data)
+
+    def fingerprint(self):
+        return self.content_hash[:12]
+
+    def best_variant(self, accept_encodings):
+        """Returns the preferred `CompressedBytes` that the client accepts, or None."""
+        for encoding, variant in self.variants.items():
+            if accept_encodings[encoding]:
+                return variant
+        return None
+
+
+class StaticAssets(object):
+    """Static files that are read and precompressed once, and identified by their content hashes.
+
+    `transform(data)` can rewrite a file's contents before it is hashed, e.g. to reference other
+    assets by their fingerprinted URLs. If `reload_on_change` is set, files are re-read when their
+    mtime changes, which is useful in development.
+    """
+
+    def __init__(self, reload_on_change=False):
+        self._reload_on_change = reload_on_change
+        self._assets = {}
+        self._transforms = {}
+        self._lock = threading.Lock()
+
+    def add(self, path, transform=None):
+        self._transforms[path] = transform
+        self._assets[path] = self._load(path)
+
+    def _load(self, path):
+        mtime = os.stat(path).st_mtime
+        with open(path, "rb") as asset_file:
+            data = asset_file.read()
+        transform = self._transforms[path]
+        if transform:
+            data = transform(data)
+        return StaticAsset(path, data, mtime)
+
+    def get(self, path):
+        asset = self._assets[path]
+        if self._reload_on_change and os.stat(path).st_mtime != asset.mtime:
+            with self._lock:
+                asset = self._assets[path] = self._load(path)
+        return asset
+
+    def fingerprint(self, path):
+        return self.get(path).fingerprint()
@@ -0,0 +1,26 @@
+import asyncio
+import time
+
+class TokenBucket(object):
+    """Limits a rate of events to `rate` per second on average, with bursts of up to `capacity`.
+
+    Not thread safe: it should only be used from a single event loop. It holds no references to the
+    loop though, so it can be created before the loop is.
+    """
+
+    def __init__(self, rate, capacity=1):
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+
+    async def acquire(self):
+        """Waits until a token is available, and takes it."""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self._capacity, self._tokens + (now - self._updated_at) * self._rate)
+            self._updated_at = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self._rate)